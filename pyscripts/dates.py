@@ -0,0 +1,60 @@
+# parses the date strings of the editions, once per distinct string
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+WHITESPACE = re.compile(r"\s+")
+ISO_DATE = re.compile(r"(\d{4})(?:-(\d{2})(?:-(\d{2}))?)?")
+# the year of dates written out ('13. Januarij dieses lauffenden 1741sten Jahrs')
+YEAR = re.compile(r"(?<!\d)(\d{4})(?!\d)")
+QUALIFIER = re.compile("before|after")
+
+
+class HistoricalDate(NamedTuple):
+    raw: str
+    year: Optional[int]
+    month: Optional[int]
+    day: Optional[int]
+    # 'day', 'month', 'year' or '' for dates without a year
+    precision: str
+    # 'before' and/or 'after' in order of appearance, both for ranges
+    # ('after arrest before execution')
+    qualifiers: tuple
+    # yyyymmdd, missing parts filled with zeros; None if not sortable
+    sort_key: Optional[int]
+
+
+def return_sort_key(year: Optional[int], month: Optional[int], day: Optional[int]) -> Optional[int]:
+    if year is None:
+        return None
+    return year * 10000 + (month or 0) * 100 + (day or 0)
+
+
+@lru_cache(maxsize=4096)
+def parse_date(raw: str) -> HistoricalDate:
+    year = month = day = None
+    precision = ""
+    iso_date = ISO_DATE.fullmatch(raw)
+    if iso_date:
+        year, month, day = (int(part) if part else None for part in iso_date.groups())
+        precision = "day" if day else "month" if month else "year"
+    else:
+        # anything else is only dated to its last year, if it has one
+        years = YEAR.findall(raw)
+        if years:
+            year = int(years[-1])
+            precision = "year"
+    return HistoricalDate(
+        raw=raw,
+        year=year,
+        month=month,
+        day=day,
+        precision=precision,
+        qualifiers=tuple(dict.fromkeys(QUALIFIER.findall(raw))),
+        sort_key=return_sort_key(year, month, day),
+    )
+
+
+@lru_cache(maxsize=4096)
+def normalize_date_text(text: str) -> str:
+    return WHITESPACE.sub(" ", text).strip()
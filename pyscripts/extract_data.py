@@ -1,87 +1,52 @@
 #!/usr/bin/env python
+import argparse
+import json
+import sys
 import typing
 import glob
 import re
 import lxml
-import json
 import os
 from pathlib import Path
 import lxml.etree as etree
 import lxml.builder as builder
 from copy import deepcopy
+from functools import cached_property
 from acdh_tei_pyutils.tei import TeiReader
 from acdh_tei_pyutils.utils import extract_fulltext
 
 # import mk_verticals
 from label_translator import label_dict
+from method_labels import MethodLabels
 from tidy_rdgs import tidy_readings
+from sqlite_export import write_sqlite
+import typesense_diff
+from facets import return_facets
+from shards import write_shards
+from text_store import TextStore
+from output_writer import output_writer
+from standoff import detach_feature_structures
+from pages import write_pages, remove_stale_pages
+from index_writer import write_index
+from prefetch import prefetch, DEFAULT_DEPTH
+from dates import HistoricalDate, parse_date, normalize_date_text
+from relations import RelationGraph
+from graph_export import write_graph
+from variants import VariantTable, return_readings, return_lemma_text
+from witness_texts import return_witness_texts
+from partitioning import (
+    parse_partition,
+    in_partition,
+    return_partition_name,
+    renumber_ids,
+    rewrite_ids,
+    rewrite_label_ids,
+)
 
 xmlns = "http://www.w3.org/XML/1998/namespace"
 
 
-punishments_dict = {
-    "bodies on wheel": "Rad (Körper)",
-    "body on wheel": "Rad (Körper)",
-    "burned": "Verbrennung",
-    "hand chopped": "Handabhauung",
-    "head on pale": "Pfahl (Kopf)",
-    "heads on pale": "Pfahl (Kopf)",
-    "pale": "Pfahl",
-    "pale (head)": "Pfahl (Kopf)",
-    "right hand chopped": "Handabhauung (rechte Hand)",
-    "quartered": "Vierteilung",
-    "shot": "Erschießung",
-    "stack": "Gesteck (Kopf)",
-    "stake": "Gesteck (Kopf)",
-    "strand": "Strang",
-    "sword": "Schwert",
-    "wheel": "Rad",
-    "30 Jahre Gefängnis zweiten Grades": "Gefängnis zweiten Grades",
-    "wheel (body)": "Rad (Körper)",
-    "wheel from above": "Rad von oben",
-    "wheel from above (begnadigt)": "Rad von oben (begnadigt)",
-    "wheel from beneath": "Rad von unten",
-    "wheel from beyond": "Rad von hinten",
-    "Zwicken mit glühenden Zangen in die rechte Brust": "glühende Zangen (rechte Brust)",
-    "dreimaliger Zwick mit glühenden Zangen an verschiedenen Orten": "glühende Zangen (x3)",
-    "Brandmarkung durch den Freymann": "Brandmarkung",
-    "zweimaliger Zwick mit glühenden Zangen": "glühende Zangen (x2)",
-    "Zwick mit glühenden Zangen in die linke Brust": "glühende Zangen (linke Brust)",
-    "Theile herumgetragen und seitlich an Galgen aufgenagelt": "Teile herumgetragen und an Galgen aufgenagelt",
-    "StrangUrteil vollzogen; dannenhero dessen Bildnuß"
-    "an die gewöhnliche Richtstatt vor "
-    "das Schotten=Thor auf dasig so genannten Rabenstein ausgeführet /"
-    " und an einem daselbst "
-    "zu diesem Ende aufgerichteten Schnell=Galgen aufgehangen / und alda drey Tag"
-    " lang hangend gelassen werden solle.": "Erhängen",
-    "Teile an den Tatorten ausgestellt": "Ausstellung der Teile am Tatort",
-    "Delinquent an dem Ort der begangenen Morde zeigen": "Ausstellung am Tatort",
-    "Schleifen auf Kuhhaut zur Richtstatt": "Schleifen auf Kuhhaut",
-    "Riemen auf der rechten Seiten aus dem Rücken schneiden": "Riemen aus dem Rücken schneiden"
-}
-
-punishments_dict_ts = {
-    "Rad (Körper)": "Rad",
-    "Pfahl (Kopf)": "Pfahl",
-    "Handabhauung (rechte Hand)": "Handabhauung",
-    "Gesteck (Kopf)": "Gesteck",
-    "Rad von oben": "Rad",
-    "Rad von oben (begnadigt)": "Rad",
-    "glühende Zangen (rechte Brust)": "Zangen",
-    "glühende Zangen (x3)": "Zangen",
-    "glühende Zangen (x2)": "Zangen",
-    "glühende Zangen (linke Brust)": "Zangen",
-    "Ausstellung der Teile am Tatort": "Ausstellung am Tatort",
-    "Brandmarkung der Wangen": "Brandmarkung",
-    "Schleifen auf Kuhhaut zur Richtstatt": "Schleifen auf Kuhhaut",
-    "unter dem Galgen begraben": "Verscharrung ",
-    "Riemen aus dem Rücken schneiden": "Riemenschneiden",
-    "Belegung mit schweren Eisen": "Schwere Eisen",
-    "Abstrafung mit 50 Stockstreichen an jedem Jahrestage seines Vergehens": "Stockstreichen",
-    "Eingeweide aus Körper gerissen": "Ausweidung",
-    "Leib darunter eingescharrt": "Verscharrung ",
-    "Gefängnis zweiten Grades": "Gefängnis"
-}
+method_labels = MethodLabels()
 
 publishers_dict = {
     "zu finden im grossen Jakoberhof Nro. 837.": "k. A.",
@@ -107,6 +72,20 @@ json_file_output = "out/json"
 xml_file_output = "out/xml"
 xml_index_output = f"{xml_file_output}/indices"
 xml_editions_output = f"{xml_file_output}/editions"
+xml_standoff_output = f"{xml_file_output}/standoff"
+xml_pages_output = f"{xml_file_output}/pages"
+sqlite_file_output = "out/armesuenderblaetter.sqlite"
+typesense_state_output = f"{json_file_output}/typesense_hashes.json"
+typesense_upserts_output = f"{json_file_output}/typesense_upserts.jsonl"
+typesense_deletes_output = f"{json_file_output}/typesense_deletes.json"
+typesense_synonyms_output = f"{json_file_output}/typesense_synonyms.json"
+variants_output = f"{json_file_output}/variants.json"
+json_witnesses_output = f"{json_file_output}/witnesses"
+json_shards_output = f"{json_file_output}/documents"
+json_manifest_output = f"{json_file_output}/manifest.json"
+text_store_output = f"{json_file_output}/texts"
+partitions_output = "out/partitions"
+graph_output = "out/graph"
 Path(f"./{json_file_output}").mkdir(parents=True, exist_ok=True)
 Path(f"./{xml_index_output}").mkdir(parents=True, exist_ok=True)
 Path(f"./{xml_editions_output}").mkdir(parents=True, exist_ok=True)
@@ -140,6 +119,8 @@ class UniqueStringVals:
         self.id_prefix = id_prefix
         self.labels_2_ids = {}
         self.ids_2_labels = {}
+        # every lookup in order, partitions record them to replay the id assignment
+        self.requested_labels = []
         if default_labels:
             for label in default_labels:
                 self.create_entry(label)
@@ -159,6 +140,7 @@ class UniqueStringVals:
         self.ids_2_labels[new_id] = label
 
     def get_id_for_label(self, label: str):
+        self.requested_labels.append(label)
         if label not in self.labels_2_ids:
             self.create_entry(label)
         return self.labels_2_ids[label]
@@ -281,8 +263,9 @@ class Event:
         # self.element_cp = deepcopy(self.element)
 
     def to_xml(self):
-        self.element.set(f"{{{xmlns}}}id", self.global_id)
-        return self.element
+        element = deepcopy(self.element)
+        element.set(f"{{{xmlns}}}id", self.global_id)
+        return element
 
     def add_selfref_as_next(self):
         if self.rs is None:
@@ -435,14 +418,9 @@ class Punishment(Event):
         for punishment in self.punishments_xml:
             counter += 1
             number = int(punishment.get("n")) if punishment.get("n") else counter
-            label = label_short = label_ts = punishment.text.strip()
-            if label in punishments_dict:
-                label_short = label_ts = punishments_dict[label]
-            if label_short in punishments_dict_ts:
-                label_ts = punishments_dict_ts[label_short]
-            p_id = punishment_index.get_id_for_label(label)
-            if label in punishments_dict:
-                label = punishments_dict[label]
+            p_id, label, label_short, label_ts = method_labels.resolve(
+                punishment.text.strip(), punishment_index
+            )
             methods.append({"id": p_id,
                             "order": number,
                             "label": label,
@@ -503,14 +481,9 @@ class Execution(Event):
         for punishment in self.methods_xml:
             counter += 1
             number = int(punishment.get("n")) if punishment.get("n") else counter
-            label = label_short = label_ts = punishment.text.strip()
-            if label in punishments_dict:
-                label_short = label_ts = punishments_dict[label]
-            if label_short in punishments_dict_ts:
-                label_ts = punishments_dict_ts[label_short]
-            p_id = execution_index.get_id_for_label(label)
-            if label in punishments_dict:
-                label = punishments_dict[label]
+            p_id, label, label_short, label_ts = method_labels.resolve(
+                punishment.text.strip(), execution_index
+            )
             methods.append({"id": p_id,
                             "order": number,
                             "label": label,
@@ -699,14 +672,15 @@ class Person:
             return self.global_id
 
     def to_xml(self):
-        self.element.set(f"{{{xmlns}}}id", self.global_id)
-        self.element.append(
+        element = deepcopy(self.element)
+        element.set(f"{{{xmlns}}}id", self.global_id)
+        element.append(
             teiMaker.note(
                 self.return_full_name(),
                 type="label",
             )
         )
-        return self.element
+        return element
 
     def add_selfref_as_next(self):
         if self.rs is None:
@@ -927,77 +901,72 @@ def extract_person(
     return person_obj
 
 
-def extract_event(event_element: etree._Element, file_identifier: str, nsmap: dict):
+# event types whose date stands in for dates without @when, by priority
+PERSON_DATE_EVENT_TYPES = ["execution", "verdict"]
+
+# what a tei:date without @when contributes to the dates of its event,
+# by number of dates in the event and position of the date
+UNDATED_DATE_PARTS = {
+    (1, 0): ["text_if_before", "person_date", "text_if_after"],
+    (2, 0): ["text", "person_date"],
+    (2, 1): ["text"],
+}
+
+DATE_PARTS = {
+    "text": lambda text, person_date: [text],
+    "text_if_before": lambda text, person_date: (
+        [text] if "before" in parse_date(text).qualifiers else []
+    ),
+    "text_if_after": lambda text, person_date: (
+        [text] if "after" in parse_date(text).qualifiers else []
+    ),
+    "person_date": lambda text, person_date: [person_date],
+}
+
+
+def return_person_date(person_element: etree._Element, nsmap: dict) -> str:
+    for event_type in PERSON_DATE_EVENT_TYPES:
+        when = person_element.xpath(
+            f"./tei:event[@type='{event_type}']/tei:desc/tei:date/@when",
+            namespaces=nsmap,
+        )
+        if when:
+            return when[0]
+    return ""
+
+
+def resolve_dates(date_elements: list, person_date: str) -> list:
+    dates = []
+    for position, date in enumerate(date_elements):
+        when = date.get("when")
+        if when is not None:
+            dates.append(when)
+            continue
+        text = normalize_date_text(" ".join(date.xpath(".//text()")))
+        for part in UNDATED_DATE_PARTS[(len(date_elements), position)]:
+            dates += DATE_PARTS[part](text, person_date)
+    return dates
+
+
+def extract_event(
+    event_element: etree._Element,
+    file_identifier: str,
+    nsmap: dict,
+    person_date: str = "",
+):
     event_type: str = event_element.xpath("./@type", namespaces=nsmap)[0]
     xml_id: list = event_element.xpath("./@xml:id", namespaces=nsmap)
     if not xml_id:
         xml_id: list = event_element.xpath("./@ref", namespaces=nsmap)
         if xml_id and xml_id[0] != "#":
             xml_id = [f"#{xml_id[0]}"]
-    dates: list = []
     date: list = event_element.xpath("./tei:desc/tei:date", namespaces=nsmap)
     if len(date) == 2:
         print(f"multiple dates in {xml_id}")
-        date1, date2 = event_element.xpath("./tei:desc/tei:date", namespaces=nsmap)
-        try:
-            date1_when = date1.attrib["when"]
-            dates.append(date1_when)
-        except KeyError:
-            date1_when = " ".join(date1.xpath(".//text()", namespaces=nsmap))
-            dates.append(re.sub(r"\s+", " ", date1_when).strip())
-            try:
-                date_exec = date1.xpath(
-                    """ancestor::tei:person/tei:event[@type='execution']
-                    /tei:desc/tei:date/@when""",
-                    namespaces=nsmap,
-                )[0]
-                dates.append(date_exec)
-            except IndexError:
-                try:
-                    date_exec = date1.xpath(
-                        """ancestor::tei:person/tei:event[@type='verdict']
-                        /tei:desc/tei:date/@when""",
-                        namespaces=nsmap,
-                    )[0]
-                    dates.append(date_exec)
-                except IndexError:
-                    date_exec = ""
-                    dates.append(date_exec)
-        try:
-            date2_when = date2.attrib["when"]
-            dates.append(date2_when)
-        except KeyError:
-            date2_when = " ".join(date2.xpath(".//text()", namespaces=nsmap))
-            dates.append(re.sub(r"\s+", " ", date2_when).strip())
-    elif len(date) == 1:
-        try:
-            date_when = date[0].attrib["when"]
-            dates.append(date_when)
-        except KeyError:
-            date_when = " ".join(date[0].xpath(".//text()", namespaces=nsmap))
-            if "before" in date_when:
-                dates.append(re.sub(r"\s+", " ", date_when).strip())
-            try:
-                date_exec = date[0].xpath(
-                    """ancestor::tei:person/tei:event[@type='execution']
-                    /tei:desc/tei:date/@when""",
-                    namespaces=nsmap,
-                )[0]
-                dates.append(date_exec)
-            except IndexError:
-                try:
-                    date_exec = date[0].xpath(
-                        """ancestor::tei:person/tei:event[@type='verdict']
-                        /tei:desc/tei:date/@when""",
-                        namespaces=nsmap,
-                    )[0]
-                    dates.append(date_exec)
-                except IndexError:
-                    date_exec = ""
-                    dates.append(date_exec)
-            if "after" in date_when:
-                dates.append(re.sub(r"\s+", " ", date_when).strip())
+    if len(date) in (1, 2):
+        dates: list = resolve_dates(date, person_date)
     else:
+        dates: list = []
         print("no date or more than two dates in ", xml_id)
     place: list = event_element.xpath(
         "./tei:desc/tei:placeName/text()[1]", namespaces=nsmap
@@ -1044,8 +1013,8 @@ def extract_event(event_element: etree._Element, file_identifier: str, nsmap: di
                 ".//tei:desc//tei:desc", namespaces=nsmap
             )
         for element in punishments_xml:
-            if element.text in punishments_dict:
-                element.text = punishments_dict[element.text]
+            if element.text is not None:
+                element.text = method_labels.normalize(element.text)
         try:
             common_args = {
                 "_type": event_type,
@@ -1070,67 +1039,19 @@ def extract_event(event_element: etree._Element, file_identifier: str, nsmap: di
     return event_obj
 
 
-def change_relations(doc: TeiReader):
-    id_has_active_relations = {}
-    id_has_passive_relations = {}
-    id_is_mentioned_in_relation = {}
-    for relation in doc.any_xpath("//tei:relation"):
-        active_el = deepcopy(relation)
-        passive_el = deepcopy(relation)
-        active_id = active_el.attrib.pop("active").removeprefix("#")
-        passive_id = passive_el.attrib.pop("passive").removeprefix("#")
-        if active_id not in id_has_active_relations:
-            id_has_active_relations[active_id] = []
-        id_has_active_relations[active_id].append(active_el)
-        if passive_id not in id_has_passive_relations:
-            id_has_passive_relations[passive_id] = []
-        id_has_passive_relations[passive_id].append(passive_el)
-        if active_id not in id_is_mentioned_in_relation:
-            id_is_mentioned_in_relation[active_id] = []
-        if passive_id not in id_is_mentioned_in_relation:
-            id_is_mentioned_in_relation[passive_id] = []
-        id_is_mentioned_in_relation[passive_id].append(active_el)
-        id_is_mentioned_in_relation[active_id].append(passive_el)
-        parent = relation.getparent()
-        parent.remove(relation)
-    for active_id, relation_elements in id_has_passive_relations.items():
-        active_xpath_expression = f"//tei:event[@xml:id='{active_id}']"
-        try:
-            if active_id == "execution":
-                active_el = doc.any_xpath(f"//tei:event[@type='{active_id}']")[0]
-            else:
-                active_el = doc.any_xpath(active_xpath_expression)[0]
-            for rel_el in relation_elements:
-                active_el.append(rel_el)
-        except IndexError:
-            pass
-    for passive_id, relation_elements in id_has_active_relations.items():
-        passive_xpath_expression = f"//tei:event[@xml:id='{passive_id}']"
-        try:
-            if passive_id == "execution":
-                passive_el = doc.any_xpath(f"//tei:event[@type='{passive_id}']")[0]
-            else:
-                passive_el = doc.any_xpath(passive_xpath_expression)[0]
-            for rel_el in relation_elements:
-                passive_el.append(rel_el)
-        except IndexError:
-            pass
-    return id_is_mentioned_in_relation
-
-
-def update_id_in_relations(event: Event, id_to_be_replaced, elements: list):
-    for el in elements:
-        el: etree._Element
-        if el.get("active") == id_to_be_replaced:
-            el.set("active", f"#{event.global_id}")
-        if el.get("passive") == id_to_be_replaced:
-            el.set("passive", f"#{event.global_id}")
+def find_related_event(doc: TeiReader, local_id: str):
+    if local_id == "execution":
+        xpath_expression = f"//tei:event[@type='{local_id}']"
+    else:
+        xpath_expression = f"//tei:event[@xml:id='{local_id}']"
+    event_elements = doc.any_xpath(xpath_expression)
+    return event_elements[0] if event_elements else None
 
 
 def extract_events_and_persons(doc: TeiReader, file_identifier: str):
     events = []
     persons = []
-    event_id_mentioned_in_relation = change_relations(doc)
+    relations = RelationGraph(doc.any_xpath("//tei:relation"))
     for person_element in doc.any_xpath("//tei:person"):
         person_obj: Person = extract_person(
             person_element, file_identifier, doc.nsmap, doc
@@ -1139,8 +1060,10 @@ def extract_events_and_persons(doc: TeiReader, file_identifier: str):
             "//tei:msIdentifier/tei:institution/text()"
         )
         persons.append(person_obj)
+        # stands in for the dates of this persons events lacking @when
+        person_date = return_person_date(person_element, doc.nsmap)
         for event_element in person_element.xpath(".//tei:event", namespaces=doc.nsmap):
-            event_obj = extract_event(event_element, file_identifier, doc.nsmap)
+            event_obj = extract_event(event_element, file_identifier, doc.nsmap, person_date)
             if event_obj:
                 if isinstance(event_obj, str):
                     event_obj = global_events_by_ids[event_obj]
@@ -1149,72 +1072,188 @@ def extract_events_and_persons(doc: TeiReader, file_identifier: str):
                 else:
                     events.append(event_obj)
                     person_obj.append_related_event(event_obj)
-                if event_obj.id in event_id_mentioned_in_relation:
-                    elements = event_id_mentioned_in_relation[event_obj.id]
-                    update_id_in_relations(event_obj, "#" + event_obj.id, elements)
+                if relations.mentions(event_obj.id):
+                    relations.resolve(event_obj.id, event_obj.global_id)
                 elif isinstance(event_obj, Execution):
-                    if "execution" in event_id_mentioned_in_relation:
-                        elements = event_id_mentioned_in_relation["execution"]
-                        update_id_in_relations(event_obj, "#execution", elements)
-    return events, persons
+                    if relations.mentions("execution"):
+                        relations.resolve("execution", event_obj.global_id)
+    # all ids are known now, the relation elements get their final ids
+    relations.materialize(lambda local_id: find_related_event(doc, local_id))
+    return events, persons, relations
 
 
-def print_to_json(objects, category):
-    object_json = dict((obj.get_global_id(), obj.to_json()) for obj in objects)
+def objects_to_json(objects):
+    return dict((obj.get_global_id(), obj.to_json()) for obj in objects)
+
+
+def write_json(object_json: dict, category: str):
     fp = f"{json_file_output}/{category}.json"
-    with open(fp, "w") as f:
-        print(f"writing to {fp}")
-        json.dump(object_json, f, indent=4)
+    print(f"writing to {fp}")
+    output_writer.write_json(fp, object_json, indent=4)
+
+
+def print_to_json(objects, category):
+    object_json = objects_to_json(objects)
+    write_json(object_json, category)
     return object_json
 
 
-def print_typesense_entries_to_json(documents):
+def return_typesense_entries(documents):
     doc_json = dict()
     for doc in documents:
         doc: XmlDocument
         key = doc.get_global_id()
         val = doc.return_prescribed_typesense_entry()
         doc_json[key] = val
-    fp = f"{json_file_output}/typesense_entries.json"
-    with open(fp, "w") as f:
-        print(f"writing to {fp}")
-        json.dump(doc_json, f, indent=4)
+    return doc_json
+
+
+def print_typesense_entries_to_json(documents):
+    doc_json = return_typesense_entries(documents)
+    write_json(doc_json, "typesense_entries")
+    return doc_json
+
+
+def print_typesense_diff_to_json(doc_json: dict, previous_state: dict):
+    typesense_diff.write_diff(
+        doc_json,
+        previous_state,
+        typesense_state_output,
+        typesense_upserts_output,
+        typesense_deletes_output,
+    )
+
+
+def print_facets_to_json(persons_json: dict, documents_json: dict):
+    fp = f"{json_file_output}/facets.json"
+    print(f"writing to {fp}")
+    output_writer.write_json(fp, return_facets(persons_json, documents_json), indent=4)
+
+
+def print_variants_to_json(variant_table: VariantTable):
+    print(f"writing to {variants_output} and {typesense_synonyms_output}")
+    output_writer.write_json(variants_output, variant_table.to_json(), ensure_ascii=False, indent=4)
+    output_writer.write_json(
+        typesense_synonyms_output, variant_table.return_synonyms(), ensure_ascii=False, indent=4
+    )
+
+
+def print_shards_to_json(
+    documents_json: dict, typesense_entries: dict, persons_json: dict, events_json: dict
+):
+    shard_documents = dict(
+        (_id, documents_json[_id] | typesense_entries[_id]) for _id in documents_json
+    )
+    write_shards(
+        json_shards_output,
+        json_manifest_output,
+        shard_documents,
+        persons_json,
+        events_json,
+    )
 
 
 def print_indices_to_json():
     for index in typed_indices:
-        with open(f"{json_file_output}/unique_{index.id_prefix}.json", "w") as f:
-            json.dump(index.ids_2_labels, f, indent=4)
+        output_writer.write_json(
+            f"{json_file_output}/unique_{index.id_prefix}.json",
+            index.ids_2_labels,
+            indent=4,
+        )
+
+
+def print_to_sqlite(documents, persons, events):
+    write_sqlite(
+        sqlite_file_output,
+        documents,
+        persons,
+        events,
+        label_indices={
+            "places": [places_index],
+            "offence_types": [offence_index],
+            "tools": [tools_index],
+            "methods": [punishment_index, execution_index],
+        },
+    )
 
 
-def write_xml(objs, list_element, path, template):
-    print(f"writing {len(objs)} items to xml")
+def return_index_entries(objs):
+    # copies, the editions are left as they are
+    return (obj.to_xml() for obj in objs)
+
+
+def replace_by_refs(objs):
+    """
+    replaces the entities in their editions by the rs pointing to their
+    index entry, once the index is written
+    """
     for obj in objs:
         obj.add_selfref_as_next()
-        obj_xml = obj.to_xml()
-        list_element.append(obj_xml)
+        obj.element.getparent().remove(obj.element)
+
+
+def write_xml(entries, list_xpath, path, template_path):
     print(f"writing to {path}")
-    template.tree_to_file(path)
+    count = write_index(path, template_path, list_xpath, tei_nsmp, entries)
+    print(f"wrote {count} items to xml")
 
 
-def print_index_to_xml(name: str, objs: list):
-    template = TeiReader(f"./template/{name}.xml")
+def return_index_paths(name: str):
+    template_path = f"./template/{name}.xml"
     out_fp = f"{xml_index_output}/{name}.xml"
     xpath = ".//tei:listPerson" if name == "listperson" else ".//tei:listEvent"
-    list_element = template.any_xpath(xpath)[0]
+    return template_path, out_fp, xpath
+
+
+def print_index_to_xml(name: str, objs: list):
+    template_path, out_fp, xpath = return_index_paths(name)
     if name == "listperson":
         objs.sort(key=lambda po: po.fullname)
-    write_xml(objs, list_element, out_fp, template)
+    write_xml(return_index_entries(objs), xpath, out_fp, template_path)
+    replace_by_refs(objs)
 
 
 def prepare_output_folder():
-    old_files = glob.glob(f"./{json_file_output}/*.json")
-    for old_file in old_files:
-        os.remove(old_file)
     os.makedirs(json_file_output, exist_ok=True)
 
 
+def remove_stale_outputs():
+    # files only get rewritten if their content changed, everything
+    # not written during this run is left over from earlier runs
+    output_writer.remove_stale(
+        json_file_output,
+        "*.json",
+        # only load_typesense.py replaces the state, see typesense_diff.commit_state
+        select=lambda filename: filename != os.path.basename(typesense_state_output),
+    )
+    # left over from --sharded runs
+    output_writer.remove_stale(json_shards_output, "*.json")
+    # left over from --text-store runs
+    output_writer.remove_stale(text_store_output, "*" + TextStore.file_ext)
+    output_writer.remove_stale(xml_index_output, "*.xml")
+    output_writer.remove_stale(xml_editions_output, "*.xml")
+    output_writer.remove_stale(xml_standoff_output, "*.json")
+    output_writer.remove_stale(json_witnesses_output, "*.json")
+    output_writer.remove_stale(graph_output)
+    remove_stale_pages(xml_pages_output)
+
+
 class XmlDocument:
+    # cached fields derived from the tree, see invalidate
+    lazy_fields = [
+        "fulltext",
+        "title",
+        "print_dates",
+        "pubPlace",
+        "publisher",
+        "archive_data",
+        "readings",
+    ]
+    # metadata only runs leave the fulltext out of the json records
+    include_fulltext = True
+    # adds the lemmas of the fulltext to the typesense entries
+    include_lemmas = False
+
     def __init__(
         self,
         xml_tree: TeiReader,
@@ -1222,6 +1261,7 @@ class XmlDocument:
         identifier: str,
         events: list,
         persons: list,
+        relations: RelationGraph = None,
     ):
         self.xml_tree: TeiReader = xml_tree
         self.path: str = path
@@ -1232,17 +1272,46 @@ class XmlDocument:
         self.punishments: list = [e for e in events if isinstance(e, Punishment)]
         self.trialresults: list = [e for e in events if isinstance(e, TrialResult)]
         self.persons: list = persons
-        self.fulltext: str = self.return_doc_text()
-        self.title: str = self.return_title()
+        self.relations: RelationGraph = relations if relations else RelationGraph()
         self.date: str = ""
-        self.pubPlace: str = ""
-        self.publisher: str = ""
         self.sorting_date = None
         self.label_year = None
-        self.get_bibl_data()
-        self.archive_institutions = []
-        self.archive_signatures = []
-        self.get_archive_data()
+
+    def invalidate(self):
+        """
+        drops the cached fields, they get recomputed from the
+        tree on the next access; call after changing the tree
+        """
+        for field in XmlDocument.lazy_fields:
+            self.__dict__.pop(field, None)
+
+    @cached_property
+    def fulltext(self) -> str:
+        return self.return_doc_text()
+
+    def return_fulltext_field(self) -> dict:
+        return {"fulltext": self.fulltext} if XmlDocument.include_fulltext else {}
+
+    @cached_property
+    def readings(self) -> list:
+        return return_readings(self.xml_tree.any_xpath("//tei:text")[0], tei_nsmp)
+
+    def return_lemma_field(self) -> dict:
+        if XmlDocument.include_fulltext and XmlDocument.include_lemmas:
+            return {"lemma_fulltext": return_lemma_text(self.readings)}
+        return {}
+
+    @cached_property
+    def title(self) -> str:
+        return self.return_title()
+
+    @property
+    def archive_institutions(self) -> list:
+        return self.archive_data[0]
+
+    @property
+    def archive_signatures(self) -> list:
+        return self.archive_data[1]
 
     def return_thumbnail_name(self):
         return self.xml_tree.any_xpath("//tei:pb/@facs")[0]
@@ -1261,7 +1330,10 @@ class XmlDocument:
     #     with open(outfile_path, "w") as of:
     #         of.write(verticals)
 
-    def get_archive_data(self):
+    @cached_property
+    def archive_data(self) -> tuple:
+        archive_institutions = []
+        archive_signatures = []
         for witness in self.xml_tree.any_xpath("//tei:msDesc"):
             arch_i = witness.xpath(
                 ".//tei:msIdentifier/tei:institution/text()",
@@ -1279,25 +1351,30 @@ class XmlDocument:
             insti_string = arch_i[0] if arch_i else ""
             # if arch_s:
             #     insti_string = f"{insti_string}, {arch_s[0]}"
-            self.archive_institutions.append(insti_string)
-            self.archive_signatures.append(f"{arch_sig} ({arch_i})")
+            archive_institutions.append(insti_string)
+            archive_signatures.append(f"{arch_sig} ({arch_i})")
+        return archive_institutions, archive_signatures
 
-    def get_bibl_data(self):
-        self.print_dates: list = self.xml_tree.any_xpath(
+    @cached_property
+    def print_dates(self) -> list:
+        print_dates = self.xml_tree.any_xpath(
             "//tei:sourceDesc//tei:biblStruct//tei:date/@when"
         )
-        if self.print_dates:
-            self.print_dates = [date.strip(" .") for date in self.print_dates]
-        self.pubPlace = self.xml_tree.any_xpath(
+        return [date.strip(" .") for date in print_dates]
+
+    @cached_property
+    def pubPlace(self) -> str:
+        pubPlace = self.xml_tree.any_xpath(
             "//tei:sourceDesc//tei:biblStruct//tei:pubPlace/text()"
         )[0]
-        if self.pubPlace in places_dict:
-            self.pubPlace = places_dict[self.pubPlace]
-        self.publisher = self.xml_tree.any_xpath(
+        return places_dict.get(pubPlace, pubPlace)
+
+    @cached_property
+    def publisher(self) -> str:
+        publisher = self.xml_tree.any_xpath(
             "//tei:sourceDesc//tei:biblStruct//tei:publisher/text()"
         )[0]
-        if self.publisher in publishers_dict:
-            self.publisher = publishers_dict[self.publisher]
+        return publishers_dict.get(publisher, publisher)
 
     def return_title(self):
         return extract_fulltext(
@@ -1340,42 +1417,32 @@ class XmlDocument:
             "filename": self.path.split("/")[-1],
             "contains_persons": persons,
             "contains_events": events,
-            "fulltext": self.fulltext,
+            **self.return_fulltext_field(),
             "archives": self.archive_institutions,
         }
 
+    def return_latest_date(self) -> typing.Optional[HistoricalDate]:
+        dates = [e.date[0] for e in self.punishments if e.date]
+        dates += [e.date[0] for e in self.executions if e.date]
+        dates += [e.date[0] for e in self.trialresults if e.date]
+        dates += self.print_dates
+        # dates without a year ('k. A.', 'before execution') are left out
+        return max(
+            (date for date in map(parse_date, dates) if date.precision),
+            key=lambda date: date.sort_key,
+            default=None,
+        )
+
     def return_sorting_date(self):
         if self.sorting_date is None:
-            nmbr_dates = []
-            dates = [e.date[0] for e in self.punishments if e.date]
-            dates += [e.date[0] for e in self.executions if e.date]
-            dates += [e.date[0] for e in self.trialresults if e.date]
-            dates += self.print_dates
-            for date in dates:
-                if re.search(r"\d", date):
-                    try:
-                        numeric_date_str = re.sub(r"[-\ .]*", "", date).strip()
-                        if (
-                            re.search("[A-Za-z]+", numeric_date_str)
-                            and numeric_date_str[-4:].isnumeric()
-                        ):
-                            numeric_date_str = numeric_date_str[-4:]
-                        nmbr_dates.append(int(f"{numeric_date_str:<08}"))
-                    except ValueError:
-                        pass
-            if nmbr_dates:
-                self.sorting_date = sorted(nmbr_dates)[-1]
-            else:
-                self.sorting_date = 0000
+            latest_date = self.return_latest_date()
+            self.sorting_date = latest_date.sort_key if latest_date else 0000
         return self.sorting_date
 
     def return_label_year(self):
         if self.label_year is None:
-            sorting_date = self.return_sorting_date()
-            if sorting_date != 0:
-                self.label_year = int(str(sorting_date)[0:4])
-            else:
-                self.label_year = 1700
+            latest_date = self.return_latest_date()
+            self.label_year = latest_date.year if latest_date else 1700
         return self.label_year
 
     def return_prescribed_typesense_entry(self):
@@ -1387,7 +1454,8 @@ class XmlDocument:
             "title": self.title,
             "id": self.get_global_id(),
             "filename": self.path.split("/")[-1],
-            "fulltext": self.fulltext,
+            **self.return_fulltext_field(),
+            **self.return_lemma_field(),
             "print_date": self.print_dates[0] if self.print_dates else "k. A.",
             "printer": self.publisher,
             "printing_location": self.pubPlace,
@@ -1404,7 +1472,8 @@ class XmlDocument:
             "filename": self.path.split("/")[-1],
             "contains_persons": [p.to_json() for p in self.persons],
             "contains_events": events_ids,
-            "fulltext": self.fulltext,
+            **self.return_fulltext_field(),
+            **self.return_lemma_field(),
             "print_date": self.print_dates[0] if self.print_dates else "",
             "execution_date": self.executions[0].date if self.executions else "",
             "execution_methods": [
@@ -1416,12 +1485,46 @@ class XmlDocument:
             "archives": self.archive_institutions,
         }
 
-    def write_changes(self):
+    def write_changes(
+        self,
+        standoff_fs=False,
+        pages=False,
+        witnesses=False,
+        editions_dir=xml_editions_output,
+        standoff_dir=xml_standoff_output,
+        witnesses_dir=json_witnesses_output,
+    ):
         filename = self.path.split("/")[-1]
-        new_path = f"{xml_editions_output}/{filename}"
+        new_path = f"{editions_dir}/{filename}"
         tidy_readings(self.xml_tree)
+        if witnesses:
+            # needs the readings linked to their witnesses
+            witness_texts = return_witness_texts(self.xml_tree.tree)
+            if witness_texts:
+                output_writer.write_json(
+                    f"{witnesses_dir}/{self.id}.json",
+                    witness_texts,
+                    ensure_ascii=False,
+                    indent=4,
+                )
+        if standoff_fs:
+            features = detach_feature_structures(self.xml_tree.tree)
+            output_writer.write_json(
+                f"{standoff_dir}/{self.id}.json",
+                features,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        self.invalidate()
         print(f"creating {new_path}")
-        self.xml_tree.tree_to_file(new_path)
+        # the tree is not touched anymore, so serializing it can overlap
+        # with preparing the next document
+        output_writer.submit(self.write_outputs, new_path, pages)
+
+    def write_outputs(self, path: str, pages=False):
+        output_writer.write_tree(path, self.xml_tree.tree)
+        if pages:
+            write_pages(self.xml_tree.tree, self.id, xml_pages_output)
 
 
 # def export_all_verticals(xml_docs, verticals_output_folder):
@@ -1438,7 +1541,390 @@ def resort_persons_for_typesense(person_objs: list):
     return person_objs
 
 
+def write_aggregates(
+    args,
+    previous_typesense_state: dict,
+    offences_json: dict,
+    punishments_json: dict,
+    executions_json: dict,
+    persons_json: dict,
+    documents_json: dict,
+    typesense_entries: dict,
+    relations_json: list,
+    variant_table: VariantTable,
+):
+    if args.text_store:
+        text_store = TextStore(text_store_output)
+        punishments_json = text_store.externalize(punishments_json, ["xml"])
+        executions_json = text_store.externalize(executions_json, ["xml"])
+        documents_json = text_store.externalize(documents_json, ["fulltext"])
+        typesense_entries = text_store.externalize(typesense_entries, ["fulltext", "lemma_fulltext"])
+        text_store.remove_stale()
+        print(
+            f"stored {len(text_store.refs)} texts ({text_store.bytes_written} bytes) "
+            f"in {text_store_output}"
+        )
+    write_json(offences_json, "offences")
+    write_json(punishments_json, "punishments")
+    write_json(executions_json, "executions")
+    write_json(persons_json, "persons")
+    write_json(relations_json, "relations")
+    # export_all_verticals(xml_docs, verticals_output_folder)
+    if not args.no_aggregates:
+        write_json(documents_json, "documents")
+        write_json(typesense_entries, "typesense_entries")
+    events_json = offences_json | punishments_json | executions_json
+    if args.sharded:
+        print_shards_to_json(documents_json, typesense_entries, persons_json, events_json)
+    print_typesense_diff_to_json(typesense_entries, previous_typesense_state)
+    print_facets_to_json(persons_json, typesense_entries)
+    if args.variants:
+        print_variants_to_json(variant_table)
+    if args.graph:
+        edge_count = write_graph(
+            graph_output,
+            persons_json,
+            offences_json,
+            punishments_json,
+            executions_json,
+            documents_json,
+        )
+        print(f"wrote {edge_count} person-event edges to {graph_output}")
+
+
+def return_counter_marks():
+    return {
+        "event": Event.random_counter,
+        "person": Person.random_counter,
+        "labels": dict(
+            (index.id_prefix, len(index.requested_labels)) for index in typed_indices
+        ),
+    }
+
+
+def serialize_index_entries(objs: list):
+    return [
+        [etree.tostring(element, encoding="unicode", with_tail=False), element.tail]
+        for element in return_index_entries(objs)
+    ]
+
+
+def return_partition_record(xml_doc, start_marks: dict, end_marks: dict):
+    """
+    everything a merge needs to recreate the outputs of a single run for
+    this document; ids ending in a counter and the ids of the label
+    indices only hold within the partition and get renumbered by the merge
+    """
+    offences = [e for e in xml_doc.events if isinstance(e, Offence)]
+    punishments = [e for e in xml_doc.events if isinstance(e, Punishment)]
+    executions = [
+        e for e in xml_doc.events if not isinstance(e, (Offence, Punishment))
+    ]
+    record = {
+        "path": xml_doc.path,
+        "counters": {
+            "event": [start_marks["event"], end_marks["event"]],
+            "person": [start_marks["person"], end_marks["person"]],
+        },
+        "numbered_ids": {
+            "event": [
+                [e.get_global_id(), int(e.id)] for e in xml_doc.events if not e.xml_source_id
+            ],
+            "person": [
+                [p.get_global_id(), int(p.id)] for p in xml_doc.persons if not p.xml_id
+            ],
+        },
+        "labels": dict(
+            (
+                index.id_prefix,
+                list(dict.fromkeys(index.requested_labels[
+                    start_marks["labels"][index.id_prefix]:end_marks["labels"][index.id_prefix]
+                ])),
+            )
+            for index in typed_indices
+        ),
+        "offences": objects_to_json(offences),
+        "punishments": objects_to_json(punishments),
+        "executions": objects_to_json(executions),
+        "persons": [p.to_json() for p in xml_doc.persons],
+        "document": xml_doc.to_json(),
+        "typesense_entry": xml_doc.return_prescribed_typesense_entry(),
+        "relations": xml_doc.relations.to_json(xml_doc.id),
+    }
+    if XmlDocument.include_lemmas:
+        variant_table = VariantTable()
+        variant_table.add(xml_doc.readings)
+        record["variants"] = variant_table.to_records()
+    # same order as the single run: events, then the persons holding their rs
+    record["index_entries"] = {}
+    for name, objs in [
+        ("offences", [e for e in xml_doc.events if e.type == "offence"]),
+        ("punishments", [e for e in xml_doc.events if e.type != "offence"]),
+        ("listperson", xml_doc.persons),
+    ]:
+        record["index_entries"][name] = serialize_index_entries(objs)
+        replace_by_refs(objs)
+    return record
+
+
+def write_partition(partition: tuple, xml_docs: list, marks: dict, standoff_fs=False, witnesses=False):
+    partition_dir = f"{partitions_output}/{return_partition_name(partition)}"
+    print(f"writing partition {partition[0]}/{partition[1]} to {partition_dir}")
+    for xml_doc in xml_docs:
+        xml_doc: XmlDocument
+        record = return_partition_record(xml_doc, *marks[xml_doc.id])
+        output_writer.write_json(f"{partition_dir}/documents/{xml_doc.id}.json", record)
+        xml_doc.write_changes(
+            standoff_fs=standoff_fs,
+            witnesses=witnesses,
+            editions_dir=f"{partition_dir}/editions",
+            standoff_dir=f"{partition_dir}/standoff",
+            witnesses_dir=f"{partition_dir}/witnesses",
+        )
+    output_writer.write_json(
+        f"{partition_dir}/partition.json",
+        {
+            "partition": list(partition),
+            "documents": [xml_doc.id for xml_doc in xml_docs],
+            "indices": dict(
+                (index.id_prefix, index.ids_2_labels) for index in typed_indices
+            ),
+            "errors": dict((path, str(err)) for path, err in error_docs.items()),
+        },
+        indent=4,
+    )
+    output_writer.drain()
+    output_writer.remove_stale(f"{partition_dir}/documents", "*.json")
+    output_writer.remove_stale(f"{partition_dir}/editions", "*.xml")
+    output_writer.remove_stale(f"{partition_dir}/standoff", "*.json")
+    output_writer.remove_stale(f"{partition_dir}/witnesses", "*.json")
+
+
+def load_partition_records(count: int):
+    records = []
+    for i in range(1, count + 1):
+        partition_dir = f"{partitions_output}/{return_partition_name((i, count))}"
+        if not os.path.isfile(f"{partition_dir}/partition.json"):
+            raise FileNotFoundError(f"partition {i}/{count} is missing in {partition_dir}")
+        with open(f"{partition_dir}/partition.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        for path, err in meta["errors"].items():
+            error_docs[path] = err
+        for doc_id in meta["documents"]:
+            with open(f"{partition_dir}/documents/{doc_id}.json", "r", encoding="utf-8") as f:
+                text = f.read()
+            records.append((json.loads(text)["path"], doc_id, text, partition_dir, meta))
+    records.sort(key=lambda record: record[0])
+    return records
+
+
+def merge_partitions(count: int, pages=False):
+    """
+    combines the partitions i/count into the results of a single run over the
+    sorted input files, writes the editions and returns the json outputs
+    and the index entries
+    """
+    records = load_partition_records(count)
+    # assign the label ids in the order of a single run first
+    for _, _, text, _, _ in records:
+        labels = json.loads(text)["labels"]
+        for index in typed_indices:
+            for label in labels[index.id_prefix]:
+                index.get_id_for_label(label)
+    label_ids = {}
+    offences_json = {}
+    punishments_json = {}
+    executions_json = {}
+    persons = []
+    documents_json = {}
+    typesense_entries = {}
+    relations_json = []
+    variant_table = VariantTable()
+    index_entries = {"offences": [], "punishments": []}
+    next_numbers = {"event": 0, "person": 0}
+    for path, doc_id, text, partition_dir, meta in records:
+        if partition_dir not in label_ids:
+            label_ids[partition_dir] = dict(
+                (local_id, index.labels_2_ids[label])
+                for index in typed_indices
+                for local_id, label in meta["indices"][index.id_prefix].items()
+            )
+        record = json.loads(text)
+        renamed = {}
+        for kind, (start, end) in record["counters"].items():
+            renamed |= renumber_ids(record["numbered_ids"][kind], start, next_numbers[kind])
+            next_numbers[kind] += end - start
+        record = rewrite_label_ids(json.loads(rewrite_ids(text, renamed)), label_ids[partition_dir])
+        offences_json |= record["offences"]
+        punishments_json |= record["punishments"]
+        executions_json |= record["executions"]
+        persons += zip(record["persons"], record["index_entries"]["listperson"])
+        documents_json[doc_id] = record["document"]
+        typesense_entries[doc_id] = record["typesense_entry"]
+        relations_json += record["relations"]
+        variant_table.add_records(record.get("variants", []))
+        index_entries["offences"] += record["index_entries"]["offences"]
+        index_entries["punishments"] += record["index_entries"]["punishments"]
+        filename = path.split("/")[-1]
+        with open(f"{partition_dir}/editions/{filename}", "r", encoding="utf-8") as f:
+            edition = rewrite_ids(f.read(), renamed).encode("utf-8")
+        print(f"creating {xml_editions_output}/{filename}")
+        output_writer.write_bytes(f"{xml_editions_output}/{filename}", edition)
+        if pages:
+            write_pages(etree.ElementTree(etree.fromstring(edition)), doc_id, xml_pages_output)
+        if os.path.isfile(f"{partition_dir}/standoff/{doc_id}.json"):
+            with open(f"{partition_dir}/standoff/{doc_id}.json", "rb") as f:
+                output_writer.write_bytes(f"{xml_standoff_output}/{doc_id}.json", f.read())
+        if os.path.isfile(f"{partition_dir}/witnesses/{doc_id}.json"):
+            with open(f"{partition_dir}/witnesses/{doc_id}.json", "rb") as f:
+                output_writer.write_bytes(f"{json_witnesses_output}/{doc_id}.json", f.read())
+    # same sorting as resort_persons_for_typesense and print_index_to_xml
+    persons.sort(key=lambda person: (person[0]["surname"], person[0]["forename"]))
+    for c, (person_json, _) in enumerate(persons, start=1):
+        person_json["sorter"] = c
+    persons_json = dict((person_json["id"], person_json) for person_json, _ in persons)
+    persons.sort(key=lambda person: person[0]["fullname"])
+    index_entries["listperson"] = [entry for _, entry in persons]
+    return (
+        offences_json,
+        punishments_json,
+        executions_json,
+        persons_json,
+        documents_json,
+        typesense_entries,
+        relations_json,
+        variant_table,
+        index_entries,
+    )
+
+
+def return_index_elements(entries: list):
+    for xml, tail in entries:
+        element = etree.fromstring(xml)
+        element.tail = tail
+        yield element
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sqlite",
+        action="store_true",
+        help=f"also write the extracted corpus to {sqlite_file_output}",
+    )
+    parser.add_argument(
+        "--typesense-state",
+        default=typesense_state_output,
+        help="content hashes of the previously indexed typesense entries, "
+        "only changed entries end up in the upserts file; the new hashes are "
+        f"written to {typesense_state_output}{typesense_diff.PENDING_SUFFIX} "
+        "until load_typesense.py loaded them",
+    )
+    parser.add_argument(
+        "--sharded",
+        action="store_true",
+        help=f"write one json file per document to {json_shards_output} "
+        f"and a manifest to {json_manifest_output}",
+    )
+    parser.add_argument(
+        "--no-aggregates",
+        action="store_true",
+        help="skip documents.json and typesense_entries.json",
+    )
+    parser.add_argument(
+        "--text-store",
+        action="store_true",
+        help=f"store fulltexts and event xml once in {text_store_output} "
+        "and reference them by hash from the json records",
+    )
+    parser.add_argument(
+        "--standoff-fs",
+        action="store_true",
+        help="move tei:fs feature structures out of the editions into "
+        f"per document json maps in {xml_standoff_output}",
+    )
+    parser.add_argument(
+        "--pages",
+        action="store_true",
+        help=f"split the editions into one fragment per facsimile page in "
+        f"{xml_pages_output} with a page manifest per document",
+    )
+    parser.add_argument(
+        "--writer-threads",
+        type=int,
+        default=0,
+        help="threads writing the editions while the next one is prepared, "
+        "by default they are written one after another",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=DEFAULT_DEPTH,
+        help="documents parsed ahead on background threads, 0 parses them "
+        f"one after another (default {DEFAULT_DEPTH} on this machine)",
+    )
+    parser.add_argument(
+        "--partition",
+        type=parse_partition,
+        help="i/N, only process the i-th of N hash partitions of the input "
+        f"files and write partial results to {partitions_output}",
+    )
+    parser.add_argument(
+        "--merge",
+        type=int,
+        metavar="N",
+        help=f"combine the partial results of the N partitions in {partitions_output} "
+        "into the outputs of a single run",
+    )
+    parser.add_argument(
+        "--no-fulltext",
+        action="store_true",
+        help="metadata only run, leaves the fulltext out of the document and "
+        "typesense records and skips extracting it",
+    )
+    parser.add_argument(
+        "--graph",
+        action="store_true",
+        help="export the person-event-document graph as compressed sparse "
+        f"row arrays (.npy) with per person aggregates to {graph_output}",
+    )
+    parser.add_argument(
+        "--variants",
+        action="store_true",
+        help="collect the spellings of each lemma into "
+        f"{variants_output}, export them as typesense synonyms to "
+        f"{typesense_synonyms_output} and add the lemmatized fulltext to the "
+        "typesense entries (pass it to the partition runs as well)",
+    )
+    parser.add_argument(
+        "--witnesses",
+        action="store_true",
+        help="write the fulltext as read by each witness of editions with "
+        f"several witnesses to {json_witnesses_output}",
+    )
+    args = parser.parse_args()
+    XmlDocument.include_fulltext = not args.no_fulltext
+    XmlDocument.include_lemmas = args.variants
+    if args.merge and args.sqlite:
+        parser.error("--sqlite needs the extracted objects, run it unpartitioned")
+    output_writer.start(args.writer_threads)
+    # read before the output folder gets cleared
+    previous_typesense_state = typesense_diff.load_state(args.typesense_state)
+    if args.merge:
+        merged = merge_partitions(args.merge, pages=args.pages)
+        prepare_output_folder()
+        write_aggregates(args, previous_typesense_state, *merged[:-1])
+        for name, entries in merged[-1].items():
+            template_path, out_fp, xpath = return_index_paths(name)
+            write_xml(return_index_elements(entries), xpath, out_fp, template_path)
+        if error_docs:
+            print(f"\n\n{len(error_docs)} faulty docs:")
+            for doc, err in error_docs.items():
+                print(f"{doc}:\t{err}")
+        output_writer.drain()
+        remove_stale_outputs()
+        output_writer.report()
+        sys.exit()
     event_objs = []
     person_objs = []
     events_json = {}
@@ -1447,13 +1933,20 @@ if __name__ == "__main__":
     # template_doc = TeiReader("template/events.xml")
     # listevent = template_doc.any_xpath(
     # ".//tei:listEvent[@type='offences']")[0]
-    for file_path in glob.glob(cases_dir):
+    # sorted, so the ids made from counters do not depend on the filesystem
+    file_paths = sorted(glob.glob(cases_dir))
+    if args.partition:
+        file_paths = [path for path in file_paths if in_partition(path, args.partition)]
+    counter_marks = {}
+    for file_path, parsed_doc in prefetch(file_paths, TeiReader, args.prefetch):
         # file_identifier = file_path.split("/")[-1]
         doc_id = re.match(".*?/([^/]+).xml", file_path).group(1)
         print(file_path)
         try:
-            tei_doc = TeiReader(file_path)
+            tei_doc = parsed_doc.result()
+            start_marks = return_counter_marks()
             entity_objects = extract_events_and_persons(tei_doc, doc_id)
+            counter_marks[doc_id] = (start_marks, return_counter_marks())
             event_objs += entity_objects[0]
             person_objs += entity_objects[1]
             xml_doc = XmlDocument(
@@ -1462,6 +1955,7 @@ if __name__ == "__main__":
                 doc_id,
                 entity_objects[0],
                 entity_objects[1],
+                entity_objects[2],
             )
             xml_docs.append(xml_doc)
         except lxml.etree.XMLSyntaxError as err:
@@ -1478,23 +1972,51 @@ if __name__ == "__main__":
             event: Offence
             _ = event.return_offence_types()
         else:
-            if event in punishments_dict_ts:
-                event = punishments_dict_ts[event]
             if isinstance(event, Punishment):
                 punishment_objects.append(event)
             else:
                 execution_objects.append(event)
         event.check_4_empty_fields()
 
+    if args.partition:
+        write_partition(
+            args.partition,
+            xml_docs,
+            counter_marks,
+            standoff_fs=args.standoff_fs,
+            witnesses=args.witnesses,
+        )
+        output_writer.report()
+        sys.exit()
     prepare_output_folder()
     # template_doc.tree_to_file(f"{xml_file_output}/events.xml")
-    print_to_json(offences_objects, "offences")
-    print_to_json(punishment_objects, "punishments")
-    print_to_json(execution_objects, "executions")
-    print_to_json(resort_persons_for_typesense(person_objs), "persons")
-    print_to_json(xml_docs, "documents")
-    # export_all_verticals(xml_docs, verticals_output_folder)
-    print_typesense_entries_to_json(xml_docs)
+    offences_json = objects_to_json(offences_objects)
+    punishments_json = objects_to_json(punishment_objects)
+    executions_json = objects_to_json(execution_objects)
+    persons_json = objects_to_json(resort_persons_for_typesense(person_objs))
+    documents_json = objects_to_json(xml_docs)
+    typesense_entries = return_typesense_entries(xml_docs)
+    relations_json = [
+        edge for xml_doc in xml_docs for edge in xml_doc.relations.to_json(xml_doc.id)
+    ]
+    variant_table = VariantTable()
+    if args.variants:
+        for xml_doc in xml_docs:
+            variant_table.add(xml_doc.readings)
+    write_aggregates(
+        args,
+        previous_typesense_state,
+        offences_json,
+        punishments_json,
+        executions_json,
+        persons_json,
+        documents_json,
+        typesense_entries,
+        relations_json,
+        variant_table,
+    )
+    if args.sqlite:
+        print_to_sqlite(xml_docs, person_objs, event_objs)
     missing_fields = ", ".join(list(set(all_missing_fields)))
     if events_with_missing_field:
         logmessage = (
@@ -1526,4 +2048,9 @@ if __name__ == "__main__":
     print_index_to_xml(name="listperson", objs=person_objs)
     for xml_doc in xml_docs:
         xml_doc: XmlDocument
-        xml_doc.write_changes()
+        xml_doc.write_changes(
+            standoff_fs=args.standoff_fs, pages=args.pages, witnesses=args.witnesses
+        )
+    output_writer.drain()
+    remove_stale_outputs()
+    output_writer.report()
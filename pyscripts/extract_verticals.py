@@ -1,14 +1,20 @@
 #!/usr/bin/env python
 # creates verticals from xml to import data to NoSketch engine
 
+import argparse
 import os
 import glob
-import shutil
 import re
 from lxml import etree as ET
 from tqdm import tqdm
 from acdh_tei_pyutils.tei import TeiReader
 from acdh_tei_pyutils.utils import extract_fulltext
+from output_writer import output_writer
+from prefetch import prefetch, DEFAULT_DEPTH
+from partitioning import parse_partition, in_partition
+from token_index import TokenIndex, VOCABULARY_FILE
+from token_store import TokenStore
+from token_offsets import write_token_offsets
 
 morph_keys = [
     'Case',
@@ -178,7 +184,6 @@ def handle_W(w) -> str:
 
 def create_dirs(output_dir: str) -> None:
     output_dir = os.path.join(output_dir, "verticals")
-    shutil.rmtree(output_dir, ignore_errors=True)
     os.makedirs(output_dir, exist_ok=True)
 
 
@@ -199,8 +204,7 @@ def extract_structure_tag(
 
 
 def write_to_tsv(output_file: str, verticals: str) -> None:
-    with open(output_file, "a", encoding="utf-8") as f:
-        f.writelines(verticals)
+    output_writer.submit(output_writer.write_text, output_file, verticals)
 
 
 def mk_docstructure_open(doc: TeiReader) -> str:
@@ -351,7 +355,7 @@ def process_element(element, verticals: list):
     return verticals
 
 
-def create_verticals(doc: TeiReader, output_filename) -> None:
+def create_verticals(doc: TeiReader, output_filename, consumers: list = []) -> None:
     verticals = []
     docstructure_opening = mk_docstructure_open(doc)
     verticals.append(docstructure_opening)
@@ -367,19 +371,71 @@ def create_verticals(doc: TeiReader, output_filename) -> None:
     output_file = os.path.join(
         output_filepath, "verticals", f"{output_filename}.tsv")
     write_to_tsv(output_file, verticals_str)
-
-
-def process_xml_files(input_dir: str, output_dir: str) -> None:
+    # further outputs built from the verticals
+    for consumer in consumers:
+        consumer.add(output_filename, verticals_str)
+
+
+def process_xml_files(
+    input_dir: str,
+    output_dir: str,
+    prefetch_depth: int = DEFAULT_DEPTH,
+    partition: tuple = None,
+    token_index: TokenIndex = None,
+    token_store: TokenStore = None,
+    offsets_dir: str = None,
+) -> None:
     create_dirs(output_dir)
-    xml_files = load_xml_files(input_dir)
+    consumers = [consumer for consumer in (token_index, token_store) if consumer is not None]
+    xml_files = sorted(load_xml_files(input_dir))
+    if partition:
+        xml_files = [xml_file for xml_file in xml_files if in_partition(xml_file, partition)]
     # Unused
     # global global_document_vocab_state
-    for xml_file in tqdm(xml_files, total=len(xml_files)):
-        doc = TeiReader(xml_file)
+    parsed_docs = prefetch(xml_files, TeiReader, prefetch_depth)
+    for xml_file, parsed_doc in tqdm(parsed_docs, total=len(xml_files)):
+        doc = parsed_doc.result()
         set_global_vocab_states(doc)
         filename = os.path.splitext(os.path.basename(xml_file))[
             0].replace(".xml", "")
-        create_verticals(doc, filename)
+        if offsets_dir:
+            # before the verticals flatten the tokens
+            write_token_offsets(doc.tree, filename, offsets_dir)
+        create_verticals(doc, filename, consumers)
+    if token_index is not None:
+        vocabulary_path = os.path.join(token_index.output_dir, VOCABULARY_FILE)
+        if not partition:
+            token_index.write_vocabulary()
+        elif os.path.isfile(vocabulary_path):
+            # a partition only sees its own documents, without the
+            # vocabulary queries look into every document
+            os.remove(vocabulary_path)
+    if token_store is not None:
+        token_count = token_store.write()
+        print(f"stored {token_count} tokens in {token_store.output_dir}")
+    output_writer.drain()
+    # unchanged verticals are not rewritten, so leftovers of
+    # removed input files have to be cleaned up explicitly
+    output_writer.remove_stale(
+        os.path.join(output_dir, "verticals"),
+        "*.tsv",
+        # other partitions take care of their own files
+        select=lambda filename: not partition or in_partition(filename.removesuffix(".tsv") + ".xml", partition),
+    )
+    if token_index is not None:
+        output_writer.remove_stale(
+            token_index.output_dir,
+            f"*{TokenIndex.file_ext}",
+            select=lambda filename: (
+                not partition or in_partition(filename.removesuffix(TokenIndex.file_ext) + ".xml", partition)
+            ),
+        )
+    if offsets_dir:
+        output_writer.remove_stale(
+            offsets_dir,
+            "*.json",
+            select=lambda filename: not partition or in_partition(filename.removesuffix(".json") + ".xml", partition),
+        )
 
 
 global_document_vocab_state = {}
@@ -403,8 +459,65 @@ def set_global_vocab_states(doc: TeiReader):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--writer-threads",
+        type=int,
+        default=0,
+        help="threads writing the tsv files while the next document is "
+        "processed, by default they are written one after another",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=DEFAULT_DEPTH,
+        help="documents parsed ahead on background threads, 0 parses them "
+        f"one after another (default {DEFAULT_DEPTH} on this machine)",
+    )
+    parser.add_argument(
+        "--partition",
+        type=parse_partition,
+        help="i/N, only process the i-th of N hash partitions of the input files",
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="also build a positional index of word, lemma and pos in "
+        f"{os.path.join(OUTPUT_PATH, 'token_index')} for kwic.py",
+    )
+    parser.add_argument(
+        "--token-store",
+        action="store_true",
+        help="also write the token columns as dictionary encoded .npy arrays to "
+        f"{os.path.join(OUTPUT_PATH, 'token_store')}",
+    )
+    parser.add_argument(
+        "--token-offsets",
+        action="store_true",
+        help="also map every token to its facsimile page, paragraph and offset in "
+        f"{os.path.join(OUTPUT_PATH, 'token_offsets')}",
+    )
+    args = parser.parse_args()
+    if args.token_store and args.partition:
+        parser.error("--token-store covers the whole corpus, run it unpartitioned")
+    output_writer.start(args.writer_threads)
     input_filepath = INPUT_PATH
     output_filepath = OUTPUT_PATH
-    process_xml_files(input_filepath, output_filepath)
+    token_index = (
+        TokenIndex(os.path.join(output_filepath, "token_index")) if args.index else None
+    )
+    token_store = (
+        TokenStore(os.path.join(output_filepath, "token_store")) if args.token_store else None
+    )
+    process_xml_files(
+        input_filepath,
+        output_filepath,
+        args.prefetch,
+        args.partition,
+        token_index,
+        token_store,
+        os.path.join(output_filepath, "token_offsets") if args.token_offsets else None,
+    )
+    output_writer.report()
     for name in ignored_elements:
         print(f"ignored {name}")
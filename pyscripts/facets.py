@@ -0,0 +1,71 @@
+# precomputes facet counts and cross tabs for the frontend
+from collections import Counter, defaultdict
+
+PERSON_FACETS = [
+    "sex",
+    "decade_age",
+    "faith",
+    "offences",
+    "execution",
+    "punishments",
+]
+
+DOCUMENT_FACETS = [
+    "label_date",
+    "printer",
+    "printing_location",
+]
+
+# (row facet, column facet)
+PERSON_CROSSTABS = [
+    ("offences", "decade_age"),
+    ("offences", "sex"),
+    ("execution", "decade_age"),
+]
+
+
+def return_values(entry: dict, facet: str) -> set:
+    # list facets count each person/document once per distinct value
+    val = entry.get(facet)
+    if isinstance(val, list):
+        return set(str(v) for v in val)
+    if val is None or val == "":
+        return set()
+    return {str(val)}
+
+
+def sort_counter(counter: Counter) -> dict:
+    return dict(sorted(counter.items(), key=lambda item: (-item[1], item[0])))
+
+
+def count_facets(entries, facets: list, crosstabs: list = []) -> dict:
+    counters = dict((facet, Counter()) for facet in facets)
+    tables = dict(
+        (f"{row}_x_{col}", defaultdict(Counter)) for row, col in crosstabs
+    )
+    total = 0
+    for entry in entries:
+        total += 1
+        values = dict((facet, return_values(entry, facet)) for facet in facets)
+        for facet, vals in values.items():
+            counters[facet].update(vals)
+        for row, col in crosstabs:
+            table = tables[f"{row}_x_{col}"]
+            for row_val in values[row]:
+                table[row_val].update(values[col])
+    result = {"count": total}
+    for facet, counter in counters.items():
+        result[facet] = sort_counter(counter)
+    for name, table in tables.items():
+        result[name] = dict(
+            (row_val, dict(sorted(table[row_val].items())))
+            for row_val in sorted(table)
+        )
+    return result
+
+
+def return_facets(persons: dict, documents: dict) -> dict:
+    return {
+        "persons": count_facets(persons.values(), PERSON_FACETS, PERSON_CROSSTABS),
+        "documents": count_facets(documents.values(), DOCUMENT_FACETS),
+    }
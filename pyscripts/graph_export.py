@@ -0,0 +1,130 @@
+# exports the person - event - document graph as compressed sparse row
+# arrays for network views; the .npy files can be opened with
+# numpy.load(path, mmap_mode="r"), ids.json maps the rows back to the ids
+import io
+import numpy as np
+from dates import parse_date
+from output_writer import output_writer
+
+EVENT_KINDS = ["offence", "punishment", "execution"]
+
+# columns of person_aggregates.npy
+PERSON_AGGREGATES = [
+    "events",
+    "offences",
+    "punishments",
+    "executions",
+    "offence_types",
+]
+
+
+def return_csr(rows: list) -> tuple:
+    """
+    rows holds the column indices of each row, returns (indptr, indices)
+    """
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(row) for row in rows])
+    indices = np.fromiter(
+        (column for row in rows for column in row), dtype=np.int32, count=int(indptr[-1])
+    )
+    return indptr, indices
+
+
+def transpose_csr(indptr: np.ndarray, indices: np.ndarray, column_count: int) -> tuple:
+    rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+    # stable, so the rows of each column stay in ascending order
+    order = np.argsort(indices, kind="stable")
+    transposed_indptr = np.zeros(column_count + 1, dtype=np.int64)
+    transposed_indptr[1:] = np.cumsum(np.bincount(indices, minlength=column_count))
+    return transposed_indptr, rows[order]
+
+
+def return_sort_key(event_json: dict) -> int:
+    dates = event_json.get("date")
+    sort_key = parse_date(dates[0]).sort_key if dates else None
+    return sort_key if sort_key else 0
+
+
+def return_graph(
+    persons_json: dict,
+    offences_json: dict,
+    punishments_json: dict,
+    executions_json: dict,
+    documents_json: dict,
+) -> tuple:
+    """
+    returns the id table and the arrays, rows follow the order of the json
+    outputs; event_date holds the yyyymmdd sort key of an events first
+    date, 0 if it has none
+    """
+    document_ids = list(documents_json)
+    document_rows = dict((doc_id, row) for row, doc_id in enumerate(document_ids))
+    event_ids = []
+    event_kinds = []
+    event_jsons = []
+    for kind, events_json in enumerate((offences_json, punishments_json, executions_json)):
+        for event_id, event_json in events_json.items():
+            event_ids.append(event_id)
+            event_kinds.append(kind)
+            event_jsons.append(event_json)
+    event_rows = dict((event_id, row) for row, event_id in enumerate(event_ids))
+    person_ids = list(persons_json)
+    person_events = [
+        list(dict.fromkeys(event_rows[event_id] for event_id in person_json["related_events"]))
+        for person_json in persons_json.values()
+    ]
+    indptr, indices = return_csr(person_events)
+    event_kind = np.array(event_kinds, dtype=np.int8)
+    kind_counts = np.zeros((len(person_ids), len(EVENT_KINDS)), dtype=np.int32)
+    np.add.at(
+        kind_counts,
+        (np.repeat(np.arange(len(person_ids)), np.diff(indptr)), event_kind[indices]),
+        1,
+    )
+    person_aggregates = np.column_stack(
+        (
+            np.diff(indptr).astype(np.int32),
+            kind_counts,
+            np.array(
+                [len(person_json["offences"]) for person_json in persons_json.values()],
+                dtype=np.int32,
+            ),
+        )
+    )
+    event_indptr, event_indices = transpose_csr(indptr, indices, len(event_ids))
+    arrays = {
+        "person_event_indptr": indptr,
+        "person_event_indices": indices,
+        "event_person_indptr": event_indptr,
+        "event_person_indices": event_indices,
+        "person_document": np.array(
+            [document_rows[p["file_identifier"]] for p in persons_json.values()], dtype=np.int32
+        ),
+        "event_document": np.array(
+            [document_rows[e["file"]] for e in event_jsons], dtype=np.int32
+        ),
+        "event_kind": event_kind,
+        "event_date": np.array([return_sort_key(e) for e in event_jsons], dtype=np.int32),
+        "person_aggregates": person_aggregates,
+    }
+    ids = {
+        "persons": person_ids,
+        "events": event_ids,
+        "documents": document_ids,
+        "event_kinds": EVENT_KINDS,
+        "person_aggregates": PERSON_AGGREGATES,
+    }
+    return ids, arrays
+
+
+def write_graph(output_dir: str, *json_outputs) -> int:
+    """
+    json_outputs as taken by return_graph, returns the number of edges
+    """
+    ids, arrays = return_graph(*json_outputs)
+    output_writer.write_json(f"{output_dir}/ids.json", ids, indent=4)
+    for name, array in arrays.items():
+        buffer = io.BytesIO()
+        np.save(buffer, array, allow_pickle=False)
+        output_writer.write_bytes(f"{output_dir}/{name}.npy", buffer.getvalue())
+    return len(arrays["person_event_indices"])
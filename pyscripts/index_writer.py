@@ -0,0 +1,66 @@
+# streams index files: template header, one entity at a time, template footer
+from copy import deepcopy
+import lxml.etree as etree
+from output_writer import output_writer
+
+
+def return_local_copy(element: etree._Element, nsmap: dict) -> etree._Element:
+    """
+    copy of element to be written within the index root, which declares
+    nsmap: xf.write serializes an element as a document of its own, so
+    the elements in the default namespace of the root drop it instead of
+    declaring it again, the other namespaces are cleaned up
+    """
+    element = deepcopy(element)
+    default_ns = nsmap.get(None)
+    # elements without a namespace would fall into the default one
+    if default_ns and all(
+        node.tag.startswith("{") for node in element.iter() if isinstance(node.tag, str)
+    ):
+        for node in element.iter(f"{{{default_ns}}}*"):
+            node.tag = etree.QName(node).localname
+    etree.cleanup_namespaces(element, top_nsmap=nsmap)
+    return element
+
+
+def write_template(xf, element: etree._Element, list_element: etree._Element, nsmap: dict, entities):
+    """
+    writes element as is, unless it contains list_element, where the
+    entities get written after the children the template already has
+    """
+    if element is not list_element and list_element not in element.iterdescendants():
+        xf.write(return_local_copy(element, nsmap), with_tail=False)
+        return
+    # only the root declares its namespaces, the others inherit them
+    with xf.element(element.tag, element.attrib, nsmap=nsmap if element.getparent() is None else None):
+        if element.text:
+            xf.write(element.text)
+        for child in element:
+            write_template(xf, child, list_element, nsmap, entities)
+            if child.tail:
+                xf.write(child.tail)
+        if element is list_element:
+            for entity in entities:
+                xf.write(return_local_copy(entity, nsmap))
+
+
+def write_index(path: str, template_path: str, list_xpath: str, nsmap: dict, entities) -> int:
+    """
+    entities is an iterable of elements, they are only serialized, so the
+    source documents they belong to are left untouched
+    """
+    template = etree.parse(template_path)
+    root = template.getroot()
+    list_element = template.xpath(list_xpath, namespaces=nsmap)[0]
+    count = 0
+
+    def counted(entities):
+        nonlocal count
+        for entity in entities:
+            count += 1
+            yield entity
+
+    with output_writer.open(path) as f, etree.xmlfile(f, encoding="UTF-8") as xf:
+        xf.write_declaration()
+        write_template(xf, root, list_element, root.nsmap, counted(entities))
+    return count
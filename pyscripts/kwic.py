@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# keyword in context lookups in the index built by extract_verticals.py --index
+import argparse
+import os
+import time
+
+from token_index import INDEXED_ATTRIBUTES, IndexedDocument, TokenIndex, return_candidates
+from token_offsets import load_token_offsets
+
+INDEX_PATH = "./out/token_index"
+OFFSETS_PATH = "./out/token_offsets"
+
+
+def parse_query(terms: list) -> list:
+    """
+    one term per token of the phrase, 'attr=value' or just the word;
+    a trailing '*' matches by prefix
+    """
+    query = []
+    for term in terms:
+        attr, sep, value = term.partition("=")
+        if not sep:
+            attr, value = "word", term
+        if attr not in INDEXED_ATTRIBUTES:
+            raise argparse.ArgumentTypeError(
+                f"unknown attribute '{attr}', expected one of {', '.join(INDEXED_ATTRIBUTES)}"
+            )
+        query.append((attr, value))
+    return query
+
+
+def kwic(index_dir: str, query: list, context: int = 5, limit: int = 0):
+    """
+    yields (doc id, position, token id, left, match, right) per hit
+    """
+    count = 0
+    for doc_id in return_candidates(index_dir, query):
+        doc = IndexedDocument(os.path.join(index_dir, doc_id + TokenIndex.file_ext))
+        for position in doc.search(query):
+            end = position + len(query)
+            yield (
+                doc_id,
+                int(position),
+                doc.ids[position],
+                " ".join(doc.words[max(0, position - context):position]),
+                " ".join(doc.words[position:end]),
+                " ".join(doc.words[end:end + context]),
+            )
+            count += 1
+            if count == limit:
+                return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="e.g. 'kwic.py lemma=Galgen', 'kwic.py pos=ADJA lemma=Mord*' or 'kwic.py zum Galgen'"
+    )
+    parser.add_argument("terms", nargs="+", help="one attr=value (or word) per token of the phrase")
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument("--context", type=int, default=5, help="tokens shown on either side")
+    parser.add_argument("--limit", type=int, default=0, help="stop after this many hits, 0 shows all")
+    parser.add_argument(
+        "--offsets",
+        action="store_true",
+        help="show the facsimile and paragraph of the hits, from extract_verticals.py --token-offsets",
+    )
+    parser.add_argument("--offsets-dir", default=OFFSETS_PATH)
+    args = parser.parse_args()
+    try:
+        query = parse_query(args.terms)
+    except argparse.ArgumentTypeError as err:
+        parser.error(str(err))
+    start = time.perf_counter()
+    hits = 0
+    token_offsets = {}
+    for doc_id, position, token_id, left, match, right in kwic(args.index, query, args.context, args.limit):
+        location = ""
+        if args.offsets:
+            if doc_id not in token_offsets:
+                token_offsets[doc_id] = load_token_offsets(args.offsets_dir, doc_id)
+            facs, paragraph, offset = token_offsets[doc_id].get(token_id, (None, None, -1))
+            location = f"{facs}\t{paragraph}:{offset}\t"
+        print(f"{doc_id}\t{token_id or position}\t{location}{left:>60} [{match}] {right}")
+        hits += 1
+    print(f"{hits} hits in {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# streams the typesense entries in batches through the jsonl import api
+# and removes deleted documents
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from text_store import resolve
+from typesense_diff import commit_state
+
+TYPESENSE_HOST = os.environ.get("TYPESENSE_HOST", "http://localhost:8108")
+TYPESENSE_API_KEY = os.environ.get("TYPESENSE_API_KEY", "")
+TYPESENSE_COLLECTION = os.environ.get("TYPESENSE_COLLECTION", "asb")
+INPUT_FILE = "out/json/typesense_entries.json"
+STATE_FILE = "out/json/typesense_hashes.json"
+
+# status codes worth another try, everything else is a client error
+RETRY_STATUS = [408, 429, 500, 502, 503, 504]
+
+
+class TypesenseImportError(Exception):
+    pass
+
+
+def iter_entries(path: str):
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        if isinstance(entries, dict):
+            entries = entries.values()
+        for entry in entries:
+            yield entry
+
+
+def iter_batches(entries, batch_size: int):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def return_import_url(host: str, collection: str, action: str) -> str:
+    return f"{host.rstrip('/')}/collections/{collection}/documents/import?action={action}"
+
+
+def send_request(
+    url: str,
+    api_key: str,
+    method: str,
+    body: bytes,
+    retries: int,
+    backoff: float,
+    timeout: float,
+):
+    attempt = 0
+    while True:
+        attempt += 1
+        request = urllib.request.Request(
+            url,
+            data=body,
+            method=method,
+            headers={
+                "Content-Type": "text/plain",
+                "X-TYPESENSE-API-KEY": api_key,
+            },
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.read().decode("utf-8"), attempt
+        except urllib.error.HTTPError as e:
+            if e.code not in RETRY_STATUS or attempt > retries:
+                raise TypesenseImportError(f"{method} failed with status {e.code}", e.read())
+        except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+            if attempt > retries:
+                raise TypesenseImportError(f"{method} failed, no connection", e)
+        time.sleep(backoff * 2 ** (attempt - 1))
+
+
+def post_batch(
+    url: str,
+    api_key: str,
+    batch: list,
+    retries: int,
+    backoff: float,
+    timeout: float,
+):
+    body = "\n".join(json.dumps(entry, ensure_ascii=False) for entry in batch)
+    results, attempt = send_request(
+        url, api_key, "POST", body.encode("utf-8"), retries, backoff, timeout
+    )
+    errors = []
+    for line in results.splitlines():
+        if line.strip():
+            result = json.loads(line)
+            if not result.get("success"):
+                errors.append(result)
+    return errors, attempt
+
+
+def delete_ids(
+    ids: list,
+    host: str,
+    collection: str,
+    api_key: str,
+    batch_size: int = 100,
+    retries: int = 3,
+    backoff: float = 0.5,
+    timeout: float = 60.0,
+):
+    deleted = 0
+    for batch in iter_batches(ids, batch_size):
+        filter_by = urllib.parse.quote(f"id:[{','.join(batch)}]")
+        url = f"{host.rstrip('/')}/collections/{collection}/documents?filter_by={filter_by}"
+        result, _ = send_request(url, api_key, "DELETE", None, retries, backoff, timeout)
+        deleted += json.loads(result).get("num_deleted", 0)
+    print(f"deleted {deleted} of {len(ids)} docs")
+    return deleted
+
+
+def upsert_synonyms(
+    synonyms: list,
+    host: str,
+    collection: str,
+    api_key: str,
+    retries: int = 3,
+    backoff: float = 0.5,
+    timeout: float = 60.0,
+):
+    for synonym in synonyms:
+        synonym = dict(synonym)
+        synonym_id = urllib.parse.quote(synonym.pop("id"), safe="")
+        url = f"{host.rstrip('/')}/collections/{collection}/synonyms/{synonym_id}"
+        body = json.dumps(synonym, ensure_ascii=False).encode("utf-8")
+        send_request(url, api_key, "PUT", body, retries, backoff, timeout)
+    print(f"upserted {len(synonyms)} synonyms")
+    return len(synonyms)
+
+
+def import_entries(
+    entries,
+    url: str,
+    api_key: str,
+    batch_size: int = 100,
+    concurrency: int = 4,
+    retries: int = 3,
+    backoff: float = 0.5,
+    timeout: float = 60.0,
+):
+    stats = {"docs": 0, "batches": 0, "errors": [], "failed_batches": [], "latencies": []}
+
+    def run_batch(nmbr, batch):
+        start = time.perf_counter()
+        try:
+            errors, attempts = post_batch(url, api_key, batch, retries, backoff, timeout)
+        except TypesenseImportError as e:
+            # the other batches still get loaded, the failed ones are reported at the end
+            return nmbr, batch, [], 0, 0.0, e
+        return nmbr, batch, errors, attempts, time.perf_counter() - start, None
+
+    def collect(future):
+        nmbr, batch, errors, attempts, latency, failure = future.result()
+        size = len(batch)
+        if failure is not None:
+            stats["failed_batches"].append(
+                {"batch": nmbr, "ids": [entry.get("id") for entry in batch], "error": failure.args[0]}
+            )
+            print(f"batch {nmbr}: {size} docs failed, {failure.args[0]}")
+            return
+        stats["docs"] += size
+        stats["batches"] += 1
+        stats["errors"] += errors
+        stats["latencies"].append(latency)
+        print(
+            f"batch {nmbr}: {size} docs in {latency:.3f}s "
+            f"({size / latency:.1f} docs/s, {attempts} attempt(s), {len(errors)} failed)"
+        )
+
+    start = time.perf_counter()
+    # at most two batches per worker are held in memory at once
+    pending = set()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for nmbr, batch in enumerate(iter_batches(entries, batch_size), start=1):
+            if len(pending) >= concurrency * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+            pending.add(executor.submit(run_batch, nmbr, batch))
+        for future in wait(pending).done:
+            collect(future)
+    stats["elapsed"] = time.perf_counter() - start
+    return stats
+
+
+def print_stats(stats: dict):
+    latencies = sorted(stats["latencies"])
+    for failed in stats["failed_batches"]:
+        print(f"batch {failed['batch']} was not loaded ({failed['error']}): {', '.join(map(str, failed['ids']))}")
+    if not latencies:
+        if not stats["failed_batches"]:
+            print("nothing to import")
+        return
+    docs_per_sec = stats["docs"] / stats["elapsed"] if stats["elapsed"] else 0
+    print(
+        f"imported {stats['docs']} docs in {stats['batches']} batches "
+        f"within {stats['elapsed']:.3f}s ({docs_per_sec:.1f} docs/s)"
+    )
+    print(
+        f"batch latency: mean {sum(latencies) / len(latencies):.3f}s, "
+        f"median {latencies[len(latencies) // 2]:.3f}s, max {latencies[-1]:.3f}s"
+    )
+    if stats["errors"]:
+        print(f"{len(stats['errors'])} documents were rejected:")
+        for error in stats["errors"]:
+            print(error)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="?", default=INPUT_FILE)
+    parser.add_argument("--host", default=TYPESENSE_HOST)
+    parser.add_argument("--api-key", default=TYPESENSE_API_KEY)
+    parser.add_argument("--collection", default=TYPESENSE_COLLECTION)
+    parser.add_argument("--action", default="upsert", choices=["create", "upsert", "update", "emplace"])
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.5, help="seconds, doubled on every retry")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--deletes",
+        help="json list of document ids to remove, eg. out/json/typesense_deletes.json",
+    )
+    parser.add_argument(
+        "--text-store",
+        help="directory to resolve '*_ref' fields from, eg. out/json/texts",
+    )
+    parser.add_argument(
+        "--synonyms",
+        help="json list of synonyms to upsert, eg. out/json/typesense_synonyms.json",
+    )
+    parser.add_argument(
+        "--state",
+        default=STATE_FILE,
+        help="typesense hashes of extract_data.py, its pending hashes replace them once everything is loaded",
+    )
+    args = parser.parse_args()
+    if args.synonyms:
+        with open(args.synonyms, "r", encoding="utf-8") as f:
+            upsert_synonyms(
+                json.load(f),
+                args.host,
+                args.collection,
+                args.api_key,
+                retries=args.retries,
+                backoff=args.backoff,
+                timeout=args.timeout,
+            )
+    if args.deletes:
+        with open(args.deletes, "r", encoding="utf-8") as f:
+            delete_ids(
+                json.load(f),
+                args.host,
+                args.collection,
+                args.api_key,
+                batch_size=args.batch_size,
+                retries=args.retries,
+                backoff=args.backoff,
+                timeout=args.timeout,
+            )
+    entries = iter_entries(args.input)
+    if args.text_store:
+        entries = (resolve(entry, args.text_store) for entry in entries)
+    stats = import_entries(
+        entries,
+        return_import_url(args.host, args.collection, args.action),
+        args.api_key,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        retries=args.retries,
+        backoff=args.backoff,
+        timeout=args.timeout,
+    )
+    print_stats(stats)
+    if stats["errors"] or stats["failed_batches"]:
+        sys.exit(1)
+    if commit_state(args.state):
+        print(f"updated {args.state}")
@@ -0,0 +1,40 @@
+# normalizes the labels of punishment and execution methods, the
+# mappings are curated in method_labels.json
+import json
+import os
+
+METHOD_LABELS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "method_labels.json")
+
+
+class MethodLabels:
+    def __init__(self, path: str = METHOD_LABELS_FILE):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        # raw label as annotated -> label shown in the app
+        self.short_labels: dict = data["short_labels"]
+        # label shown in the app -> coarser label for the typesense facets
+        self.typesense_labels: dict = data["typesense_labels"]
+        self.labels = dict(
+            (raw_label, self.return_labels(raw_label)) for raw_label in self.short_labels
+        )
+        self.resolved = {}
+
+    def return_labels(self, raw_label: str) -> tuple:
+        label_short = self.short_labels.get(raw_label, raw_label)
+        label_ts = self.typesense_labels.get(label_short, label_short)
+        return label_short, label_short, label_ts
+
+    def normalize(self, raw_label: str) -> str:
+        return self.short_labels.get(raw_label, raw_label)
+
+    def resolve(self, raw_label: str, index) -> tuple:
+        """
+        returns (id, label, label_short, label_ts) of raw_label, the id
+        taken from the UniqueStringVals index on the first lookup
+        """
+        key = (index.id_prefix, raw_label)
+        if key not in self.resolved:
+            if raw_label not in self.labels:
+                self.labels[raw_label] = self.return_labels(raw_label)
+            self.resolved[key] = (index.get_id_for_label(raw_label),) + self.labels[raw_label]
+        return self.resolved[key]
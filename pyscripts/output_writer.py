@@ -0,0 +1,171 @@
+# writes output files atomically and only if their content changed
+import filecmp
+import fnmatch
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import lxml.etree as etree
+
+# mkstemp creates files readable by the owner only
+_umask = os.umask(0)
+os.umask(_umask)
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class OutputWriter:
+    def __init__(self):
+        self.written = 0
+        self.skipped = 0
+        self.removed = 0
+        self.paths = set()
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pending = None
+        self.futures = []
+
+    def start(self, threads: int, max_pending: int = 0):
+        """
+        runs jobs passed to submit on a pool of threads; at most max_pending
+        jobs (twice the threads by default) are queued, submit blocks until
+        one of them is done
+        """
+        if threads > 0:
+            self.executor = ThreadPoolExecutor(max_workers=threads)
+            self.pending = threading.BoundedSemaphore(max_pending or threads * 2)
+
+    def submit(self, fn, *args, **kwargs):
+        # without a started pool jobs run right away
+        if self.executor is None:
+            fn(*args, **kwargs)
+            return
+        self.pending.acquire()
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self.pending.release()
+            raise
+        future.add_done_callback(lambda _: self.pending.release())
+        self.futures.append(future)
+
+    def drain(self):
+        """
+        waits for all submitted jobs and raises the first error one of them hit
+        """
+        if self.executor is None:
+            return
+        futures, self.futures = self.futures, []
+        self.executor.shutdown(wait=True)
+        self.executor = None
+        for future in futures:
+            future.result()
+
+    def is_unchanged(self, path: str, data: bytes) -> bool:
+        try:
+            if os.path.getsize(path) != len(data):
+                return False
+        except OSError:
+            return False
+        return file_digest(path) == hashlib.sha256(data).hexdigest()
+
+    def write_bytes(self, path: str, data: bytes) -> bool:
+        with self.lock:
+            self.paths.add(os.path.abspath(path))
+        if self.is_unchanged(path, data):
+            with self.lock:
+                self.skipped += 1
+            return False
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.chmod(tmp_path, 0o666 & ~_umask)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        with self.lock:
+            self.written += 1
+        return True
+
+    @contextmanager
+    def open(self, path: str):
+        """
+        binary file to stream the content of path into, without holding it
+        in memory; it replaces path once the block is done, unless the
+        content turned out unchanged
+        """
+        with self.lock:
+            self.paths.add(os.path.abspath(path))
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                yield f
+            unchanged = os.path.isfile(path) and filecmp.cmp(tmp_path, path, shallow=False)
+            if not unchanged:
+                os.chmod(tmp_path, 0o666 & ~_umask)
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self.lock:
+            if unchanged:
+                self.skipped += 1
+            else:
+                self.written += 1
+
+    def write_text(self, path: str, text: str) -> bool:
+        return self.write_bytes(path, text.encode("utf-8"))
+
+    def write_json(self, path: str, obj, **kwargs) -> bool:
+        return self.write_text(path, json.dumps(obj, **kwargs))
+
+    def write_tree(self, path: str, tree: etree._ElementTree) -> bool:
+        # same serialization as TeiReader.tree_to_file
+        return self.write_bytes(
+            path, etree.tostring(tree, xml_declaration=True, encoding="UTF-8")
+        )
+
+    def remove_stale(self, directory: str, pattern: str = "*", select=None):
+        """
+        removes files matching pattern in directory that were not written
+        (or found unchanged) during this run; select can restrict this
+        further to the filenames this run is responsible for
+        """
+        if not os.path.isdir(directory):
+            return
+        for filename in os.listdir(directory):
+            path = os.path.abspath(os.path.join(directory, filename))
+            if (
+                os.path.isfile(path)
+                and fnmatch.fnmatch(filename, pattern)
+                and (select is None or select(filename))
+                and path not in self.paths
+            ):
+                os.remove(path)
+                with self.lock:
+                    self.removed += 1
+
+    def report(self):
+        print(
+            f"wrote {self.written} files, skipped {self.skipped} unchanged, "
+            f"removed {self.removed} stale"
+        )
+
+
+output_writer = OutputWriter()
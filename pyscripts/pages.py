@@ -0,0 +1,128 @@
+# splits editions into one well-formed fragment per facsimile page
+import os
+from bisect import bisect_left
+from copy import deepcopy
+import lxml.etree as etree
+from output_writer import output_writer
+
+TEI_NS = "http://www.tei-c.org/ns/1.0"
+PB_TAG = f"{{{TEI_NS}}}pb"
+W_TAG = f"{{{TEI_NS}}}w"
+TEXT_TAG = f"{{{TEI_NS}}}text"
+XML_ID = "{http://www.w3.org/XML/1998/namespace}id"
+
+
+def is_primary_pb(pb: etree._Element) -> bool:
+    # secondary page breaks belong to other witnesses of the same print
+    return pb.get("facs") is not None and pb.get("type", "primary") == "primary"
+
+
+def index_elements(root: etree._Element):
+    """
+    returns the document order position of every element and the
+    position of the last element in its subtree
+    """
+    positions = dict((element, pos) for pos, element in enumerate(root.iter()))
+    last_positions = dict(positions)
+    for element in reversed(list(positions)):
+        parent = element.getparent()
+        if parent is not None and last_positions[element] > last_positions[parent]:
+            last_positions[parent] = last_positions[element]
+    return positions, last_positions
+
+
+def copy_range(
+    element: etree._Element,
+    start: int,
+    end: int,
+    positions: dict,
+    last_positions: dict,
+) -> etree._Element:
+    """
+    copies everything of element that lies between the positions start
+    (inclusive) and end (exclusive); ancestors opened before start get
+    re-opened and elements still open at end are closed
+    """
+    pos = positions[element]
+    if start <= pos and last_positions[element] < end:
+        copy = deepcopy(element)
+        copy.tail = None
+        return copy
+    copy = etree.Element(element.tag, element.attrib, nsmap=element.nsmap)
+    if start <= pos < end:
+        copy.text = element.text
+    for child in element:
+        if last_positions[child] < start or positions[child] >= end:
+            continue
+        child_copy = copy_range(child, start, end, positions, last_positions)
+        if start <= last_positions[child] < end:
+            child_copy.tail = child.tail
+        copy.append(child_copy)
+    return copy
+
+
+def split_pages(tree: etree._ElementTree):
+    """
+    returns (page_break, fragment, tokens) for every primary tei:pb, tokens
+    being the document order indices of the tei:w starting on the page
+    """
+    root = tree.getroot()
+    positions, last_positions = index_elements(root)
+    page_breaks = [pb for pb in root.iter(PB_TAG) if is_primary_pb(pb)]
+    if not page_breaks:
+        return []
+    token_positions = [positions[w] for w in root.iter(W_TAG)]
+    # whatever precedes the first page break within tei:text goes to page one
+    text = next(root.iter(TEXT_TAG), None)
+    starts = [positions[pb] for pb in page_breaks]
+    if text is not None:
+        starts[0] = min(starts[0], positions[text])
+    ends = starts[1:] + [len(positions)]
+    pages = []
+    for pb, start, end in zip(page_breaks, starts, ends):
+        fragment = copy_range(root, start, end, positions, last_positions)
+        tokens = range(
+            bisect_left(token_positions, start), bisect_left(token_positions, end)
+        )
+        pages.append((pb, fragment, tokens))
+    return pages
+
+
+def write_pages(tree: etree._ElementTree, doc_id: str, output_dir: str) -> list:
+    """
+    writes the pages of the edition to output_dir/doc_id/<n>.xml and the
+    manifest the viewer pages through to output_dir/doc_id.json
+    """
+    doc_dir = os.path.join(output_dir, doc_id)
+    token_ids = [w.get(XML_ID) for w in tree.getroot().iter(W_TAG)]
+    manifest = []
+    for n, (pb, fragment, tokens) in enumerate(split_pages(tree), start=1):
+        filename = f"{n}.xml"
+        output_writer.write_bytes(
+            os.path.join(doc_dir, filename),
+            etree.tostring(fragment, xml_declaration=True, encoding="UTF-8"),
+        )
+        manifest.append(
+            {
+                "n": n,
+                "facs": pb.get("facs"),
+                "file": f"{doc_id}/{filename}",
+                "tokens": [tokens[0], tokens[-1] + 1] if tokens else [],
+                "first_token": token_ids[tokens[0]] if tokens else None,
+                "last_token": token_ids[tokens[-1]] if tokens else None,
+            }
+        )
+    output_writer.write_json(os.path.join(output_dir, f"{doc_id}.json"), manifest, indent=4)
+    return manifest
+
+
+def remove_stale_pages(output_dir: str):
+    if not os.path.isdir(output_dir):
+        return
+    output_writer.remove_stale(output_dir, "*.json")
+    for dirname in os.listdir(output_dir):
+        doc_dir = os.path.join(output_dir, dirname)
+        if os.path.isdir(doc_dir):
+            output_writer.remove_stale(doc_dir, "*.xml")
+            if not os.listdir(doc_dir):
+                os.rmdir(doc_dir)
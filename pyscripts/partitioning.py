@@ -0,0 +1,73 @@
+# partitions the input files for runs on several machines and helps
+# merging their partial outputs into the outputs of a single run
+import argparse
+import hashlib
+import os
+import re
+
+
+def parse_partition(value: str) -> tuple:
+    """
+    parses 'i/N', the i-th of N partitions counting from 1
+    """
+    match = re.fullmatch(r"(\d+)/(\d+)", value)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"expected i/N with 1 <= i <= N, got '{value}'")
+    return int(match.group(1)), int(match.group(2))
+
+
+def partition_of(path: str, count: int) -> int:
+    # only the filename counts, so the partition does not depend on the checkout
+    digest = hashlib.sha1(os.path.basename(path).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def in_partition(path: str, partition: tuple) -> bool:
+    return partition_of(path, partition[1]) == partition[0]
+
+
+def return_partition_name(partition: tuple) -> str:
+    return f"{partition[0]}_of_{partition[1]}"
+
+
+def renumber_ids(numbered_ids: list, start: int, global_start: int) -> dict:
+    """
+    numbered_ids holds [id, number] for ids ending in a zero padded counter
+    that was at start before the document was processed in its partition and
+    is at global_start in a single run; returns the ids that change
+    """
+    renamed = {}
+    for _id, number in numbered_ids:
+        new_number = global_start + number - start
+        if new_number != number:
+            renamed[_id] = _id.removesuffix(f"{number:04}") + f"{new_number:04}"
+    return renamed
+
+
+def rewrite_ids(text: str, renamed: dict) -> str:
+    if not renamed:
+        return text
+    pattern = re.compile(
+        "("
+        + "|".join(re.escape(_id) for _id in sorted(renamed, key=len, reverse=True))
+        + r")(?![0-9A-Za-z_])"
+    )
+    return pattern.sub(lambda match: renamed[match.group(1)], text)
+
+
+def rewrite_label_ids(obj, renamed: dict):
+    """
+    replaces the values of 'id' keys found in renamed, recursively
+    """
+    if isinstance(obj, dict):
+        return dict(
+            (
+                key,
+                renamed.get(val, val) if key == "id" and isinstance(val, str)
+                else rewrite_label_ids(val, renamed),
+            )
+            for key, val in obj.items()
+        )
+    if isinstance(obj, list):
+        return [rewrite_label_ids(val, renamed) for val in obj]
+    return obj
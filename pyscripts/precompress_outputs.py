@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# writes precompressed .gz/.br siblings of the outputs for static hosting,
+# optionally minifying the compressed payloads
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import brotli
+from lxml import etree as ET
+from output_writer import output_writer
+
+OUTPUT_PATH = "./out"
+# default location, the workflows keep the state in the data repo instead so
+# it survives the clean up of out/
+STATE_FILE = ".precompress_state.json"
+COMPRESSIBLE_EXTENSIONS = [".json", ".jsonl", ".xml", ".tsv", ".txt"]
+COMPRESSED_EXTENSIONS = [".gz", ".br"]
+
+
+def minify_json(data: bytes) -> bytes:
+    return json.dumps(
+        json.loads(data), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def minify_jsonl(data: bytes) -> bytes:
+    lines = [minify_json(line) for line in data.splitlines() if line.strip()]
+    return b"\n".join(lines) + b"\n" if lines else b""
+
+
+def minify_xml(data: bytes) -> bytes:
+    # whitespace-only nodes collapse to one newline instead of being
+    # dropped, tokens in mixed content must stay separated
+    root = ET.fromstring(data)
+    for element in root.iter():
+        if element.text is not None and not element.text.strip():
+            element.text = "\n"
+        if element.tail is not None and not element.tail.strip():
+            element.tail = "\n"
+    return ET.tostring(root.getroottree(), xml_declaration=True, encoding="UTF-8")
+
+
+MINIFIERS = {
+    ".json": minify_json,
+    ".jsonl": minify_jsonl,
+    ".xml": minify_xml,
+}
+
+
+def list_files(output_dir: str, state_path: str):
+    source_files = []
+    orphans = []
+    for root, dirs, files in os.walk(output_dir):
+        # skip .git when run on the cloned data repo
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for filename in files:
+            path = os.path.join(root, filename)
+            if os.path.abspath(path) == os.path.abspath(state_path):
+                continue
+            base, ext = os.path.splitext(path)
+            if ext in COMPRESSIBLE_EXTENSIONS:
+                source_files.append(path)
+            elif ext in COMPRESSED_EXTENSIONS and not os.path.exists(base):
+                orphans.append(path)
+    return sorted(source_files), orphans
+
+
+def load_state(state_path: str) -> dict:
+    if os.path.isfile(state_path):
+        with open(state_path, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(state_path: str, state: dict):
+    with open(state_path, "w") as f:
+        json.dump(state, f, indent=4, sort_keys=True)
+
+
+def process_file(path: str, known_state: dict, minify: bool, brotli_quality: int):
+    """
+    the source file is left as it is, the manifests and the write-if-changed
+    checks of the extract scripts hash it; only the compressed siblings get
+    minified
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    file_state = {"digest": digest, "minified": minify}
+    siblings_exist = all(os.path.exists(path + ext) for ext in COMPRESSED_EXTENSIONS)
+    # state holds the digest of the source and whether its siblings were
+    # minified, so an already processed file is skipped without parsing it
+    if file_state == known_state and siblings_exist:
+        return {"path": path, "state": file_state, "action": "skipped", "sizes": None}
+    action = "compressed"
+    ext = os.path.splitext(path)[1]
+    if minify and ext in MINIFIERS:
+        minified = MINIFIERS[ext](data)
+        if minified != data:
+            data = minified
+            action = "minified"
+    gz_data = gzip.compress(data, compresslevel=9, mtime=0)
+    br_data = brotli.compress(data, quality=brotli_quality)
+    output_writer.write_bytes(path + ".gz", gz_data)
+    output_writer.write_bytes(path + ".br", br_data)
+    return {
+        "path": path,
+        "state": file_state,
+        "action": action,
+        "sizes": (len(data), len(gz_data), len(br_data)),
+    }
+
+
+def precompress_outputs(
+    output_dir: str,
+    minify: bool,
+    brotli_quality: int = 11,
+    workers: int = None,
+    state_path: str = None,
+):
+    start = time.perf_counter()
+    state_path = state_path or os.path.join(output_dir, STATE_FILE)
+    state = load_state(state_path)
+    source_files, orphans = list_files(output_dir, state_path)
+    for orphan in orphans:
+        os.remove(orphan)
+    new_state = {}
+    counts = {"skipped": 0, "compressed": 0, "minified": 0}
+    totals = [0, 0, 0]
+    # zlib and brotli release the GIL while compressing
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        results = executor.map(
+            lambda path: process_file(
+                path,
+                state.get(os.path.relpath(path, output_dir)),
+                minify,
+                brotli_quality,
+            ),
+            source_files,
+        )
+        for result in results:
+            new_state[os.path.relpath(result["path"], output_dir)] = result["state"]
+            counts[result["action"]] += 1
+            if result["sizes"]:
+                totals = [t + s for t, s in zip(totals, result["sizes"])]
+    save_state(state_path, new_state)
+    print(
+        f"{len(source_files)} files: {counts['minified']} minified and compressed, "
+        f"{counts['compressed']} compressed, {counts['skipped']} unchanged; "
+        f"removed {len(orphans)} orphaned siblings in {time.perf_counter() - start:.2f}s"
+    )
+    if totals[0]:
+        print(
+            f"processed {totals[0]} bytes -> {totals[1]} bytes gzip, "
+            f"{totals[2]} bytes brotli"
+        )
+    return new_state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output_dir", nargs="?", default=OUTPUT_PATH)
+    parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="compress json/xml files without indentation, the files themselves stay as they are",
+    )
+    parser.add_argument("--brotli-quality", type=int, default=11)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--state",
+        default=None,
+        help=f"digests of the processed files, defaults to {STATE_FILE} in output_dir; "
+        "keys are paths relative to output_dir",
+    )
+    args = parser.parse_args()
+    precompress_outputs(
+        args.output_dir, args.minify, args.brotli_quality, args.workers, args.state
+    )
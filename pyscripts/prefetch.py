@@ -0,0 +1,35 @@
+# parses documents on background threads ahead of the loop consuming them
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# parsing ahead only helps if there is a core left next to the consumer
+DEFAULT_DEPTH = min(4, (os.cpu_count() or 1) - 1)
+
+
+def prefetch(paths: list, load, depth: int = DEFAULT_DEPTH):
+    """
+    yields (path, future) in the order of paths while up to depth further
+    documents are loaded in the background; lxml releases the GIL while
+    parsing, so threads are enough. future.result() returns what load
+    returned for the path or raises what it raised, with depth 0 the
+    documents are loaded one after another
+    """
+    if depth <= 0:
+        for path in paths:
+            future = Future()
+            try:
+                future.set_result(load(path))
+            except Exception as err:
+                future.set_exception(err)
+            yield path, future
+        return
+    with ThreadPoolExecutor(max_workers=depth) as executor:
+        queue = deque()
+        for path in paths:
+            queue.append((path, executor.submit(load, path)))
+            # the consumer holds one document, depth are parsed ahead
+            if len(queue) > depth:
+                yield queue.popleft()
+        while queue:
+            yield queue.popleft()
@@ -0,0 +1,86 @@
+# keeps the tei:relation elements of a document as edges between local
+# event ids, the relation elements of the events are only built once the
+# events got their global ids
+import lxml.etree as etree
+from copy import deepcopy
+from typing import NamedTuple
+
+
+class Edge(NamedTuple):
+    # the tei:relation as annotated, detached from the tree
+    relation: etree._Element
+    # local ids without '#', 'execution' stands for the execution event
+    active: str
+    passive: str
+
+
+class RelationGraph:
+    def __init__(self, relations=()):
+        self.edges: list = []
+        # local id -> edges it takes part in as active/passive party
+        self.active: dict = {}
+        self.passive: dict = {}
+        # local id -> global id, the first event resolving an id wins
+        self.global_ids: dict = {}
+        for relation in relations:
+            self.add(relation)
+
+    def add(self, relation: etree._Element):
+        edge = Edge(
+            relation,
+            relation.get("active").removeprefix("#"),
+            relation.get("passive").removeprefix("#"),
+        )
+        self.edges.append(edge)
+        self.active.setdefault(edge.active, []).append(edge)
+        self.passive.setdefault(edge.passive, []).append(edge)
+        relation.getparent().remove(relation)
+
+    def mentions(self, local_id: str) -> bool:
+        return local_id in self.active or local_id in self.passive
+
+    def resolve(self, local_id: str, global_id: str):
+        self.global_ids.setdefault(local_id, global_id)
+
+    def return_ref(self, edge: Edge, role: str) -> str:
+        ref = edge.relation.get(role)
+        local_id = getattr(edge, role)
+        if ref == f"#{local_id}" and local_id in self.global_ids:
+            return f"#{self.global_ids[local_id]}"
+        return ref
+
+    def materialize(self, find_event):
+        """
+        appends a relation element pointing to the other party to each
+        event taking part in a relation, the events that are passive first;
+        find_event returns the event element of a local id or None
+        """
+        for role, other, edges_by_id in (
+            ("passive", "active", self.passive),
+            ("active", "passive", self.active),
+        ):
+            for local_id, edges in edges_by_id.items():
+                event_element = find_event(local_id)
+                if event_element is None:
+                    continue
+                for edge in edges:
+                    attrib = dict(
+                        (key, self.return_ref(edge, other) if key == other else val)
+                        for key, val in edge.relation.attrib.items()
+                        if key != role
+                    )
+                    element = etree.SubElement(event_element, edge.relation.tag, attrib)
+                    element.text = edge.relation.text
+                    element.extend(deepcopy(child) for child in edge.relation)
+                    element.tail = edge.relation.tail
+
+    def to_json(self, document_id: str) -> list:
+        return [
+            dict(edge.relation.attrib)
+            | {
+                "active": self.return_ref(edge, "active").removeprefix("#"),
+                "passive": self.return_ref(edge, "passive").removeprefix("#"),
+                "document": document_id,
+            }
+            for edge in self.edges
+        ]
@@ -0,0 +1,51 @@
+# writes one json file per document and a manifest for lazy loading
+import hashlib
+import json
+import os
+from output_writer import output_writer
+
+
+def return_shard(document: dict, persons: dict, events: dict) -> dict:
+    shard = dict(document)
+    shard["persons"] = dict(
+        (_id, persons[_id]) for _id in document["contains_persons"] if _id in persons
+    )
+    shard["events"] = dict(
+        (_id, events[_id]) for _id in document["contains_events"] if _id in events
+    )
+    return shard
+
+
+def write_shards(
+    output_dir: str,
+    manifest_path: str,
+    documents: dict,
+    persons: dict,
+    events: dict,
+):
+    """
+    documents maps document ids to their merged document and typesense
+    records, persons and events are the dicts written to the aggregate files
+    """
+    manifest = []
+    print(f"writing {len(documents)} document shards to {output_dir}")
+    for _id, document in documents.items():
+        shard = return_shard(document, persons, events)
+        data = json.dumps(shard, indent=4).encode("utf-8")
+        filename = f"{_id}.json"
+        output_writer.write_bytes(os.path.join(output_dir, filename), data)
+        manifest.append(
+            {
+                "id": _id,
+                "title": document["title"],
+                "sorting_date": document["sorting_date"],
+                "file": filename,
+                "size": len(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+            }
+        )
+    manifest.sort(key=lambda entry: (entry["sorting_date"], entry["id"]))
+    output_writer.remove_stale(output_dir, "*.json")
+    print(f"writing to {manifest_path}")
+    output_writer.write_json(manifest_path, manifest, indent=4)
+    return manifest
@@ -0,0 +1,234 @@
+# writes the extracted corpus into a single, indexed sqlite database
+import json
+import os
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE documents (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    filename TEXT,
+    sorting_date INTEGER,
+    label_date INTEGER,
+    print_date TEXT,
+    printer TEXT,
+    printing_location TEXT,
+    thumbnail TEXT,
+    fulltext TEXT
+);
+CREATE TABLE places (id TEXT PRIMARY KEY, label TEXT);
+CREATE TABLE offence_types (id TEXT PRIMARY KEY, label TEXT);
+CREATE TABLE tools (id TEXT PRIMARY KEY, label TEXT);
+CREATE TABLE methods (id TEXT PRIMARY KEY, label TEXT);
+CREATE TABLE persons (
+    id TEXT PRIMARY KEY,
+    document_id TEXT REFERENCES documents(id),
+    sorter INTEGER,
+    forename TEXT,
+    surname TEXT,
+    fullname TEXT,
+    birth_place TEXT,
+    sex TEXT,
+    age TEXT,
+    decade_age TEXT,
+    type TEXT,
+    marriage_status TEXT,
+    faith TEXT,
+    occupation TEXT
+);
+CREATE TABLE events (
+    id TEXT PRIMARY KEY,
+    document_id TEXT REFERENCES documents(id),
+    type TEXT,
+    date TEXT,
+    description TEXT,
+    proven_by_persecution INTEGER,
+    completed INTEGER,
+    aided INTEGER
+);
+CREATE TABLE person_events (
+    person_id TEXT REFERENCES persons(id),
+    event_id TEXT REFERENCES events(id),
+    position INTEGER
+);
+CREATE TABLE event_places (
+    event_id TEXT REFERENCES events(id),
+    place_id TEXT REFERENCES places(id),
+    position INTEGER
+);
+CREATE TABLE event_offence_types (
+    event_id TEXT REFERENCES events(id),
+    offence_type_id TEXT REFERENCES offence_types(id),
+    position INTEGER
+);
+CREATE TABLE event_tools (
+    event_id TEXT REFERENCES events(id),
+    tool_id TEXT REFERENCES tools(id),
+    position INTEGER
+);
+CREATE TABLE event_methods (
+    event_id TEXT REFERENCES events(id),
+    method_id TEXT REFERENCES methods(id),
+    position INTEGER,
+    label TEXT,
+    label_short TEXT,
+    label_ts TEXT
+);
+"""
+
+# created after the bulk insert, building them on filled tables is cheaper
+INDICES = {
+    "idx_documents_sorting_date": "documents(sorting_date)",
+    "idx_persons_document": "persons(document_id)",
+    "idx_persons_sex": "persons(sex)",
+    "idx_persons_decade_age": "persons(decade_age)",
+    "idx_events_document": "events(document_id)",
+    "idx_events_type": "events(type)",
+    "idx_person_events_person": "person_events(person_id)",
+    "idx_person_events_event": "person_events(event_id)",
+    "idx_event_places_place": "event_places(place_id)",
+    "idx_event_places_event": "event_places(event_id)",
+    "idx_event_offence_types_type": "event_offence_types(offence_type_id)",
+    "idx_event_tools_tool": "event_tools(tool_id)",
+    "idx_event_methods_method": "event_methods(method_id)",
+}
+
+
+def document_row(doc) -> tuple:
+    return (
+        doc.get_global_id(),
+        doc.title,
+        doc.path.split("/")[-1],
+        doc.return_sorting_date(),
+        doc.return_label_year(),
+        doc.print_dates[0] if doc.print_dates else "k. A.",
+        doc.publisher,
+        doc.pubPlace,
+        doc.return_thumbnail_name(),
+        doc.fulltext if doc.include_fulltext else None,
+    )
+
+
+def person_row(person) -> tuple:
+    return (
+        person.get_global_id(),
+        person.file_identifier,
+        person.typesense_sorter,
+        person.forename,
+        person.surname,
+        person.return_full_name(),
+        person.return_birth_place(),
+        person.sex,
+        person.age,
+        person.decade_age,
+        person.type,
+        person.marriage_status,
+        person.faith,
+        ", ".join([i.strip() for i in person.occupation]),
+    )
+
+
+def event_row(event) -> tuple:
+    # offence status fields only exist on offences
+    return (
+        event.get_global_id(),
+        event.file_identifier,
+        event.type,
+        json.dumps(event.date, ensure_ascii=False),
+        event.description,
+        getattr(event, "proven_by_persecution", None),
+        getattr(event, "completed", None),
+        getattr(event, "aided", None),
+    )
+
+
+def label_rows(indices: list) -> list:
+    rows = []
+    for index in indices:
+        rows += list(index.ids_2_labels.items())
+    return rows
+
+
+def write_sqlite(
+    db_path: str,
+    documents: list,
+    persons: list,
+    events: list,
+    label_indices: dict,
+):
+    """
+    label_indices maps the label tables (places, offence_types, tools, methods)
+    to the UniqueStringVals instances that hold their ids
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    person_events = []
+    for person in persons:
+        for position, event in enumerate(person.related_events, start=1):
+            person_events.append(
+                (person.get_global_id(), event.get_global_id(), position)
+            )
+    event_places = []
+    event_offence_types = []
+    event_tools = []
+    event_methods = []
+    for event in events:
+        event_id = event.get_global_id()
+        for position, place in enumerate(event.places, start=1):
+            event_places.append((event_id, place["id"], position))
+        for offence_type in getattr(event, "offence_types", None) or []:
+            event_offence_types.append(
+                (event_id, offence_type["id"], offence_type["order"])
+            )
+        for tool in getattr(event, "tools", []):
+            event_tools.append((event_id, tool["id"], tool["order"]))
+        for method in getattr(event, "methods", []):
+            event_methods.append(
+                (
+                    event_id,
+                    method["id"],
+                    method["order"],
+                    method["label"],
+                    method["label_short"],
+                    method["label_ts"],
+                )
+            )
+    print(f"writing to {db_path}")
+    con = sqlite3.connect(db_path)
+    try:
+        con.executescript(SCHEMA)
+        # one transaction for the whole bulk insert
+        with con:
+            for table, indices in label_indices.items():
+                con.executemany(
+                    f"INSERT INTO {table} VALUES (?, ?)", label_rows(indices)
+                )
+            con.executemany(
+                "INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [document_row(doc) for doc in documents],
+            )
+            con.executemany(
+                "INSERT INTO persons VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [person_row(person) for person in persons],
+            )
+            con.executemany(
+                "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [event_row(event) for event in events],
+            )
+            con.executemany(
+                "INSERT INTO person_events VALUES (?, ?, ?)", person_events
+            )
+            con.executemany("INSERT INTO event_places VALUES (?, ?, ?)", event_places)
+            con.executemany(
+                "INSERT INTO event_offence_types VALUES (?, ?, ?)", event_offence_types
+            )
+            con.executemany("INSERT INTO event_tools VALUES (?, ?, ?)", event_tools)
+            con.executemany(
+                "INSERT INTO event_methods VALUES (?, ?, ?, ?, ?, ?)", event_methods
+            )
+            for name, target in INDICES.items():
+                con.execute(f"CREATE INDEX {name} ON {target}")
+        con.execute("ANALYZE")
+    finally:
+        con.close()
+    return db_path
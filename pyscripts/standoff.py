@@ -0,0 +1,43 @@
+# moves tei:fs feature structures out of the editions into a json map
+import json
+import lxml.etree as etree
+
+FS_TAG = "{http://www.tei-c.org/ns/1.0}fs"
+F_TAG = "{http://www.tei-c.org/ns/1.0}f"
+XML_ID = "{http://www.w3.org/XML/1998/namespace}id"
+
+
+def detach_feature_structures(tree: etree._ElementTree) -> dict:
+    """
+    removes all tei:fs from the tree and returns their features; most
+    tokens share the same few feature sets, so 'ana' maps the xml:id the
+    tokens point to via @ana onto an index into 'features'
+    """
+    feature_sets = []
+    set_indices = {}
+    ana = {}
+    for fs in list(tree.iter(FS_TAG)):
+        fs_features = {}
+        for f in fs.iter(F_TAG):
+            name = f.get("name")
+            val = (f.text or "").strip()
+            if name not in fs_features:
+                fs_features[name] = val
+            elif isinstance(fs_features[name], list):
+                fs_features[name].append(val)
+            else:
+                fs_features[name] = [fs_features[name], val]
+        key = json.dumps(fs_features, sort_keys=True)
+        if key not in set_indices:
+            set_indices[key] = len(feature_sets)
+            feature_sets.append(fs_features)
+        ana[fs.get(XML_ID)] = set_indices[key]
+        parent = fs.getparent()
+        if fs.tail and fs.tail.strip():
+            previous = fs.getprevious()
+            if previous is not None:
+                previous.tail = (previous.tail or "") + fs.tail
+            else:
+                parent.text = (parent.text or "") + fs.tail
+        parent.remove(fs)
+    return {"features": feature_sets, "ana": ana}
@@ -0,0 +1,5 @@
+# the scripts import their sibling modules directly
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
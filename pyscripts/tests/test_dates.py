@@ -0,0 +1,60 @@
+from dates import parse_date
+
+# date strings as they reach parse_date: @when of the events and of the
+# prints, the text of undated tei:date and the written out print dates,
+# with (year, month, day, precision, sort_key)
+CORPUS_DATES = {
+    "1700-01-15": (1700, 1, 15, "day", 17000115),
+    "1773-09-02": (1773, 9, 2, "day", 17730902),
+    "1794-09-10": (1794, 9, 10, "day", 17940910),
+    "1741-01": (1741, 1, None, "month", 17410100),
+    "1735-07": (1735, 7, None, "month", 17350700),
+    "1716": (1716, None, None, "year", 17160000),
+    "1795": (1795, None, None, "year", 17950000),
+    "": (None, None, None, "", None),
+    "k. A.": (None, None, None, "", None),
+    "before execution": (None, None, None, "", None),
+    "before exection": (None, None, None, "", None),
+    "after execution": (None, None, None, "", None),
+    "2ten Octobris dieses Jahrs": (None, None, None, "", None),
+    # written out dates are only dated to their year
+    "2. Herbstmonat 1773.": (1773, None, None, "year", 17730000),
+    "10ten September 1794.": (1794, None, None, "year", 17940000),
+    "13. Januarij dieses lauffenden 1741sten Jahrs": (1741, None, None, "year", 17410000),
+    "26. Augusti Augusti An. 1749.": (1749, None, None, "year", 17490000),
+    "10. 16. 16. Februarii 1769.": (1769, None, None, "year", 17690000),
+    # digit runs longer than a year are no year
+    "17300-01-01": (None, None, None, "", None),
+}
+
+
+def test_corpus_dates():
+    for raw, expected in CORPUS_DATES.items():
+        date = parse_date(raw)
+        assert (date.year, date.month, date.day, date.precision, date.sort_key) == expected, raw
+        assert date.raw == raw
+
+
+def test_sort_keys_order_by_precision():
+    # a day sorts after its month, the month after its year
+    keys = [parse_date(raw).sort_key for raw in ["1773", "1773-09", "1773-09-02", "1774"]]
+    assert keys == sorted(keys)
+
+
+def test_qualifiers():
+    assert parse_date("before execution").qualifiers == ("before",)
+    assert parse_date("before exection").qualifiers == ("before",)
+    assert parse_date("after execution").qualifiers == ("after",)
+    assert parse_date("1773-09-02").qualifiers == ()
+    assert parse_date("after arrest before execution").qualifiers == ("after", "before")
+    assert parse_date("after arrest, after trial").qualifiers == ("after",)
+
+
+def test_parsed_once_per_string():
+    parse_date.cache_clear()
+    dates = list(CORPUS_DATES) * 3
+    for raw in dates:
+        parse_date(raw)
+    info = parse_date.cache_info()
+    assert info.misses == len(CORPUS_DATES)
+    assert info.hits == len(dates) - len(CORPUS_DATES)
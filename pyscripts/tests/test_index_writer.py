@@ -0,0 +1,41 @@
+import lxml.etree as etree
+
+from index_writer import write_index
+
+TEI_NS = "http://www.tei-c.org/ns/1.0"
+TEMPLATE = f"""<TEI xmlns="{TEI_NS}" xmlns:x="urn:template">
+  <teiHeader><title x:n="1">Index</title></teiHeader>
+  <text><body><listEvent>
+  </listEvent></body></text>
+</TEI>"""
+EDITION = f"""<TEI xmlns="{TEI_NS}" xmlns:x="urn:edition" xmlns:unused="urn:unused">
+  <p><event type="a&gt;b" xml:id="e1"><desc>d<x:note/><date/></desc></event> tail</p>
+</TEI>"""
+
+
+def test_entities_are_written_within_the_root_namespaces(tmp_path):
+    template_path = tmp_path / "template.xml"
+    template_path.write_text(TEMPLATE, encoding="utf-8")
+    edition = etree.fromstring(EDITION)
+    event = edition.find(f".//{{{TEI_NS}}}event")
+    path = str(tmp_path / "index.xml")
+    count = write_index(path, str(template_path), ".//tei:listEvent", {"tei": TEI_NS}, [event])
+    assert count == 1
+    with open(path, "rb") as f:
+        data = f.read()
+    assert data.startswith(b"<?xml version='1.0' encoding='UTF-8'?>\n<TEI")
+    # the tei namespace is declared once, the prefix bound elsewhere on the entity
+    assert data.count(TEI_NS.encode()) == 1
+    assert (
+        b'<event xmlns:x="urn:edition" type="a&gt;b" xml:id="e1"><desc>d<x:note/><date/></desc></event> tail'
+        in data
+    )
+    assert b"urn:unused" not in data
+    index = etree.fromstring(data)
+    written = index.find(f".//{{{TEI_NS}}}event")
+    assert etree.tostring(written, method="c14n", exclusive=True) == etree.tostring(
+        event, method="c14n", exclusive=True
+    )
+    assert index.find(f".//{{{TEI_NS}}}title").get("{urn:template}n") == "1"
+    # the edition is left as it was
+    assert event.getparent() is not None and event.get("{http://www.w3.org/XML/1998/namespace}id") == "e1"
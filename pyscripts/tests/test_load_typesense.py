@@ -0,0 +1,128 @@
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from load_typesense import TypesenseImportError, delete_ids, import_entries, post_batch, return_import_url
+
+
+class StubTypesense(BaseHTTPRequestHandler):
+    """
+    answers with the queued statuses first, then like typesense would
+    """
+
+    def respond(self, body: dict):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(length).decode("utf-8")
+        server.requests.append((self.command, self.path, self.headers.get("X-TYPESENSE-API-KEY"), data))
+        status = server.statuses.pop(0) if server.statuses else 200
+        payload = (
+            "\n".join(json.dumps({"success": True}) for line in data.splitlines())
+            if status == 200 and self.command == "POST"
+            else json.dumps(body)
+        ).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        self.respond({"message": "rate limited"})
+
+    def do_DELETE(self):
+        self.respond({"num_deleted": 2})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def typesense():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubTypesense)
+    server.requests = []
+    server.statuses = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def return_host(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_post_batch_retries_rate_limits(typesense):
+    typesense.statuses = [429]
+    url = return_import_url(return_host(typesense), "asb", "upsert")
+    batch = [{"id": "fb_1", "title": "Moral"}, {"id": "fb_2", "title": "Urtheil"}]
+    errors, attempts = post_batch(url, "key", batch, retries=3, backoff=0.01, timeout=5)
+    assert (errors, attempts) == ([], 2)
+    assert len(typesense.requests) == 2
+    for method, path, api_key, body in typesense.requests:
+        assert (method, path, api_key) == ("POST", "/collections/asb/documents/import?action=upsert", "key")
+        assert [json.loads(line) for line in body.splitlines()] == batch
+
+
+def test_import_entries_sends_every_entry_once(typesense):
+    typesense.statuses = [429]
+    entries = [{"id": f"fb_{i}"} for i in range(5)]
+    stats = import_entries(
+        iter(entries),
+        return_import_url(return_host(typesense), "asb", "upsert"),
+        "key",
+        batch_size=2,
+        concurrency=1,
+        backoff=0.01,
+        timeout=5,
+    )
+    assert (stats["docs"], stats["batches"], stats["errors"]) == (5, 3, [])
+    # the rate limited batch is sent twice
+    bodies = [body for _, _, _, body in typesense.requests]
+    assert len(bodies) == 4
+    assert bodies[0] == bodies[1]
+    assert [[json.loads(line)["id"] for line in body.splitlines()] for body in bodies[1:]] == [
+        ["fb_0", "fb_1"],
+        ["fb_2", "fb_3"],
+        ["fb_4"],
+    ]
+
+
+def test_delete_ids_filters_by_id(typesense):
+    typesense.statuses = [429]
+    deleted = delete_ids(["fb_1", "fb_2"], return_host(typesense), "asb", "key", backoff=0.01, timeout=5)
+    assert deleted == 2
+    assert len(typesense.requests) == 2
+    method, path, api_key, _ = typesense.requests[-1]
+    url = urllib.parse.urlsplit(path)
+    assert (method, url.path, api_key) == ("DELETE", "/collections/asb/documents", "key")
+    assert urllib.parse.parse_qs(url.query) == {"filter_by": ["id:[fb_1,fb_2]"]}
+
+
+def test_client_errors_are_not_retried(typesense):
+    typesense.statuses = [400]
+    url = return_import_url(return_host(typesense), "asb", "upsert")
+    with pytest.raises(TypesenseImportError, match="status 400"):
+        post_batch(url, "key", [{"id": "fb_1"}], retries=3, backoff=0.01, timeout=5)
+    assert len(typesense.requests) == 1
+
+
+def test_failed_batches_do_not_stop_the_import(typesense):
+    typesense.statuses = [200, 400]
+    entries = [{"id": f"fb_{i}"} for i in range(5)]
+    stats = import_entries(
+        iter(entries),
+        return_import_url(return_host(typesense), "asb", "upsert"),
+        "key",
+        batch_size=2,
+        concurrency=1,
+        backoff=0.01,
+        timeout=5,
+    )
+    assert (stats["docs"], stats["batches"]) == (3, 2)
+    assert [(failed["batch"], failed["ids"]) for failed in stats["failed_batches"]] == [(2, ["fb_2", "fb_3"])]
+    assert "status 400" in stats["failed_batches"][0]["error"]
+    assert len(typesense.requests) == 3
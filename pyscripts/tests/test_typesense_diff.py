@@ -0,0 +1,24 @@
+import json
+
+from typesense_diff import PENDING_SUFFIX, commit_state, load_state, write_diff
+
+
+def test_state_is_committed_after_loading(tmp_path):
+    state_path = str(tmp_path / "typesense_hashes.json")
+    upserts_path = str(tmp_path / "typesense_upserts.jsonl")
+    deletes_path = str(tmp_path / "typesense_deletes.json")
+    entries = {"fb_1": {"id": "fb_1", "title": "Moral"}, "fb_2": {"id": "fb_2", "title": "Urtheil"}}
+    assert write_diff(entries, load_state(state_path), state_path, upserts_path, deletes_path) == (["fb_1", "fb_2"], [])
+    # nothing loaded yet, the next run diffs against the same state
+    assert load_state(state_path) == {}
+    assert write_diff(entries, load_state(state_path), state_path, upserts_path, deletes_path) == (["fb_1", "fb_2"], [])
+    assert commit_state(state_path)
+    assert not commit_state(state_path)
+    assert set(load_state(state_path)) == {"fb_1", "fb_2"}
+    entries["fb_1"]["title"] = "Moral Catharina J."
+    del entries["fb_2"]
+    assert write_diff(entries, load_state(state_path), state_path, upserts_path, deletes_path) == (["fb_1"], ["fb_2"])
+    with open(upserts_path, "r", encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == [entries["fb_1"]]
+    with open(state_path + PENDING_SUFFIX, "r", encoding="utf-8") as f:
+        assert set(json.load(f)) == {"fb_1"}
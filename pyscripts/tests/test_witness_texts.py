@@ -0,0 +1,32 @@
+import lxml.etree as etree
+
+from witness_texts import return_witness_texts
+
+EDITION = """<TEI xmlns="http://www.tei-c.org/ns/1.0">
+  <teiHeader>
+    <sourceDesc>
+      <listWit>
+        <witness xml:id="wien" type="primary"/>
+        <witness xml:id="linz"/>
+      </listWit>
+    </sourceDesc>
+  </teiHeader>
+  <text>
+    <p>Der <app><lem wit="#wien">Dieb</lem> <rdg wit="#linz">Räuber</rdg></app> wurde zum
+    <app><rdg wit="#linz">Schwerdt</rdg><lem>Galgen</lem></app>, und am <sic>Mondtag</sic>
+    <app><lem>Montag</lem></app> gehenckt.<fs><f>note</f></fs> Amen.</p>
+  </text>
+</TEI>"""
+
+
+def test_text_after_a_reading_goes_to_every_witness():
+    texts = return_witness_texts(etree.ElementTree(etree.fromstring(EDITION)))
+    assert texts == [
+        {"id": "wien", "type": "primary", "text": "Der Dieb wurde zum Galgen, und am Montag gehenckt. Amen."},
+        {"id": "linz", "type": "secondary", "text": "Der Räuber wurde zum Schwerdt, und am Montag gehenckt. Amen."},
+    ]
+
+
+def test_single_witness_editions_have_no_witness_texts():
+    tree = etree.ElementTree(etree.fromstring(EDITION.replace('<witness xml:id="linz"/>', "")))
+    assert return_witness_texts(tree) == []
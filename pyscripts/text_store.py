@@ -0,0 +1,54 @@
+# content addressed store for large text blobs shared between json outputs
+import hashlib
+import os
+from output_writer import output_writer
+
+REF_SUFFIX = "_ref"
+
+
+class TextStore:
+    file_ext = ".txt"
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.refs = set()
+        self.bytes_written = 0
+
+    def put(self, text: str) -> str:
+        data = text.encode("utf-8")
+        ref = hashlib.sha256(data).hexdigest()
+        if ref not in self.refs:
+            output_writer.write_bytes(
+                os.path.join(self.output_dir, ref + TextStore.file_ext), data
+            )
+            self.refs.add(ref)
+            self.bytes_written += len(data)
+        return ref
+
+    def externalize(self, records: dict, fields: list) -> dict:
+        """
+        returns copies of the records where the given text fields are
+        replaced by '<field>_ref' holding the hash of the stored text
+        """
+        externalized = {}
+        for _id, record in records.items():
+            record = dict(record)
+            for field in fields:
+                if isinstance(record.get(field), str):
+                    record[field + REF_SUFFIX] = self.put(record.pop(field))
+            externalized[_id] = record
+        return externalized
+
+    def remove_stale(self):
+        output_writer.remove_stale(self.output_dir, "*" + TextStore.file_ext)
+
+
+def resolve(record: dict, text_dir: str) -> dict:
+    resolved = {}
+    for key, val in record.items():
+        if key.endswith(REF_SUFFIX):
+            with open(os.path.join(text_dir, val + TextStore.file_ext), "r", encoding="utf-8") as f:
+                resolved[key.removesuffix(REF_SUFFIX)] = f.read()
+        else:
+            resolved[key] = val
+    return resolved
@@ -0,0 +1,204 @@
+# positional inverted index over the verticals, one file per document with
+# the sorted terms and posting arrays of word, lemma and pos, plus a
+# vocabulary mapping each term to the documents it occurs in
+import bisect
+import io
+import json
+import os
+import zipfile
+import numpy as np
+from output_writer import output_writer
+
+# columns of the token lines, see the attrs of the doc structure
+TOKEN_ATTRIBUTES = ["word", "lemma", "pos", "vocab", "id"]
+INDEXED_ATTRIBUTES = ["word", "lemma", "pos"]
+VOCABULARY_FILE = "vocabulary.json"
+# fixed, so unchanged documents give identical files
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+def is_structure(line: str) -> bool:
+    return line.startswith("<") and line.endswith(">") and "\t" not in line
+
+
+def return_tokens(vertical: str) -> list:
+    """
+    returns the token lines of a vertical as lists of TOKEN_ATTRIBUTES,
+    missing columns (e.g. of punctuation) are empty strings
+    """
+    tokens = []
+    for line in vertical.split("\n"):
+        if not line or is_structure(line):
+            continue
+        fields = line.split("\t")
+        tokens.append(fields + [""] * (len(TOKEN_ATTRIBUTES) - len(fields)))
+    return tokens
+
+
+def join_strings(strings) -> np.ndarray:
+    # each string gets terminated, so [] and [""] stay apart
+    return np.frombuffer("".join(f"{string}\n" for string in strings).encode("utf-8"), dtype=np.uint8)
+
+
+def split_strings(array: np.ndarray) -> list:
+    return array.tobytes().decode("utf-8").split("\n")[:-1]
+
+
+def return_postings(values: list) -> tuple:
+    """
+    returns (terms, offsets, positions): the sorted distinct values, and
+    the positions of terms[i] in positions[offsets[i]:offsets[i + 1]]
+    """
+    terms = sorted(set(values))
+    term_ids = dict((term, i) for i, term in enumerate(terms))
+    column = np.fromiter((term_ids[val] for val in values), dtype=np.int32, count=len(values))
+    # stable, so the positions of each term stay ascending
+    positions = np.argsort(column, kind="stable").astype(np.int32)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(column, minlength=len(terms)))
+    return terms, offsets, positions
+
+
+def write_npz(path: str, arrays: dict):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zf:
+        for name, array in arrays.items():
+            array_buffer = io.BytesIO()
+            np.lib.format.write_array(array_buffer, array, allow_pickle=False)
+            zf.writestr(zipfile.ZipInfo(f"{name}.npy", ZIP_DATE), array_buffer.getvalue())
+    output_writer.write_bytes(path, buffer.getvalue())
+
+
+class TokenIndex:
+    file_ext = ".npz"
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        # attribute -> term -> numbers of the documents containing it
+        self.vocabulary = dict((attr, {}) for attr in INDEXED_ATTRIBUTES)
+        self.documents = []
+
+    def add(self, doc_id: str, vertical: str) -> int:
+        """
+        indexes the tokens of a vertical, returns their number
+        """
+        tokens = return_tokens(vertical)
+        arrays = {}
+        for attr in INDEXED_ATTRIBUTES:
+            column = TOKEN_ATTRIBUTES.index(attr)
+            terms, offsets, positions = return_postings([token[column] for token in tokens])
+            arrays[f"{attr}_terms"] = join_strings(terms)
+            arrays[f"{attr}_offsets"] = offsets
+            arrays[f"{attr}_positions"] = positions
+            for term in terms:
+                self.vocabulary[attr].setdefault(term, []).append(len(self.documents))
+        # the word of each position for the context of hits, and the
+        # token ids to look them up in the editions
+        word_terms = split_strings(arrays["word_terms"])
+        word_ids = dict((term, i) for i, term in enumerate(word_terms))
+        arrays["words"] = np.array([word_ids[token[0]] for token in tokens], dtype=np.int32)
+        arrays["ids"] = join_strings(token[4] for token in tokens)
+        write_npz(os.path.join(self.output_dir, doc_id + TokenIndex.file_ext), arrays)
+        self.documents.append(doc_id)
+        return len(tokens)
+
+    def write_vocabulary(self):
+        output_writer.write_json(
+            os.path.join(self.output_dir, VOCABULARY_FILE),
+            {"documents": self.documents}
+            | dict(
+                (attr, dict(sorted(terms.items())))
+                for attr, terms in self.vocabulary.items()
+            ),
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+
+class IndexedDocument:
+    """
+    read side of one document of a TokenIndex
+    """
+
+    def __init__(self, path: str):
+        with np.load(path, allow_pickle=False) as npz:
+            self.arrays = dict(npz.items())
+        self.terms = dict(
+            (attr, split_strings(self.arrays[f"{attr}_terms"])) for attr in INDEXED_ATTRIBUTES
+        )
+        self.words = np.array(self.terms["word"], dtype=object)[self.arrays["words"]]
+        self._ids = None
+
+    @property
+    def ids(self) -> list:
+        if self._ids is None:
+            self._ids = split_strings(self.arrays["ids"])
+        return self._ids
+
+    def return_positions(self, attr: str, value: str) -> np.ndarray:
+        """
+        positions of the tokens whose attr equals value, or starts with it
+        if value ends with '*'
+        """
+        terms = self.terms[attr]
+        offsets = self.arrays[f"{attr}_offsets"]
+        if value.endswith("*"):
+            prefix = value[:-1]
+            start = bisect.bisect_left(terms, prefix)
+            end = start
+            while end < len(terms) and terms[end].startswith(prefix):
+                end += 1
+        else:
+            start = bisect.bisect_left(terms, value)
+            end = start + 1 if start < len(terms) and terms[start] == value else start
+        if start == end:
+            return np.array([], dtype=np.int32)
+        positions = self.arrays[f"{attr}_positions"][offsets[start]:offsets[end]]
+        return np.sort(positions) if end - start > 1 else positions
+
+    def search(self, query: list) -> np.ndarray:
+        """
+        query holds one (attr, value) per token of a phrase, returns the
+        positions where the phrase starts
+        """
+        hits = None
+        for offset, (attr, value) in enumerate(query):
+            positions = self.return_positions(attr, value) - offset
+            hits = positions if hits is None else hits[np.isin(hits, positions, assume_unique=True)]
+            if not len(hits):
+                break
+        return hits
+
+
+def load_vocabulary(index_dir: str):
+    path = os.path.join(index_dir, VOCABULARY_FILE)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def return_candidates(index_dir: str, query: list) -> list:
+    """
+    the documents that can contain the phrase, all of them if there is
+    no vocabulary (as after partitioned runs)
+    """
+    vocabulary = load_vocabulary(index_dir)
+    if vocabulary is None:
+        return sorted(
+            filename.removesuffix(TokenIndex.file_ext)
+            for filename in os.listdir(index_dir)
+            if filename.endswith(TokenIndex.file_ext)
+        )
+    candidates = None
+    for attr, value in query:
+        terms = vocabulary[attr]
+        if value.endswith("*"):
+            doc_numbers = set(
+                doc_number for term, doc_numbers in terms.items()
+                if term.startswith(value[:-1]) for doc_number in doc_numbers
+            )
+        else:
+            doc_numbers = set(terms.get(value, []))
+        candidates = doc_numbers if candidates is None else candidates & doc_numbers
+    return [vocabulary["documents"][doc_number] for doc_number in sorted(candidates)]
@@ -0,0 +1,131 @@
+# maps the tokens of an edition to their facsimile page, their paragraph
+# and their character offset in it, so hits can be shown in place
+import json
+import os
+import lxml.etree as etree
+from output_writer import output_writer
+from pages import is_primary_pb, PB_TAG, TEXT_TAG, TEI_NS, W_TAG, XML_ID
+
+# elements the tokens are located in, add_ids.py gives them their ids
+PARAGRAPH_TAGS = [f"{{{TEI_NS}}}p", f"{{{TEI_NS}}}l"]
+# text left out of the fulltext, see XmlDocument.return_doc_text
+SKIPPED_TAGS = [f"{{{TEI_NS}}}{tag}" for tag in ["rdg", "sic", "fs", "f", "figDesc"]]
+
+
+class TextLength:
+    """
+    length of a text as extract_fulltext normalizes it, whitespace runs
+    collapsed to one space and stripped at both ends, fed chunk by chunk
+    """
+
+    def __init__(self):
+        self.length = 0
+        # the last chunk ended within a word
+        self.in_word = False
+
+    def add(self, text: str):
+        if not text:
+            return
+        words = text.split()
+        for i, word in enumerate(words):
+            continues_word = i == 0 and self.in_word and not text[0].isspace()
+            if self.length and not continues_word:
+                self.length += 1
+            self.length += len(word)
+        self.in_word = bool(words) and not text[-1].isspace()
+
+    def return_next_offset(self) -> int:
+        # where the next word starts
+        return self.length + 1 if self.length and not self.in_word else self.length
+
+
+class TokenOffsets:
+    def __init__(self):
+        self.pages = []
+        self.paragraphs = []
+        self.tokens = {"id": [], "page": [], "paragraph": [], "offset": []}
+        # (index in paragraphs, TextLength) of the open paragraphs
+        self.open_paragraphs = []
+
+    def add_text(self, text: str):
+        for _, text_length in self.open_paragraphs:
+            text_length.add(text)
+
+    def add_token(self, token_id: str):
+        paragraph, text_length = self.open_paragraphs[-1] if self.open_paragraphs else (-1, None)
+        self.tokens["id"].append(token_id)
+        self.tokens["page"].append(len(self.pages) - 1)
+        self.tokens["paragraph"].append(paragraph)
+        self.tokens["offset"].append(text_length.return_next_offset() if text_length else -1)
+
+    def walk(self, element: etree._Element, skipped=False):
+        if element.tag == PB_TAG and is_primary_pb(element):
+            self.pages.append(element.get("facs"))
+        elif element.tag == W_TAG and element.get(XML_ID):
+            self.add_token(element.get(XML_ID))
+        is_paragraph = element.tag in PARAGRAPH_TAGS and element.get(XML_ID) is not None
+        if is_paragraph:
+            self.paragraphs.append(element.get(XML_ID))
+            self.open_paragraphs.append((len(self.paragraphs) - 1, TextLength()))
+        skipped = skipped or element.tag in SKIPPED_TAGS
+        if not skipped:
+            self.add_text(element.text)
+        for child in element:
+            self.walk(child, skipped)
+            if not skipped:
+                self.add_text(child.tail)
+        if is_paragraph:
+            self.open_paragraphs.pop()
+
+    def to_json(self) -> dict:
+        if self.pages:
+            # tokens before the first page break are on the first page, as in pages.py
+            self.tokens["page"] = [max(page, 0) for page in self.tokens["page"]]
+        return {"pages": self.pages, "paragraphs": self.paragraphs, "tokens": self.tokens}
+
+
+def return_token_offsets(tree: etree._ElementTree) -> dict:
+    """
+    pages holds the @facs of the primary page breaks, paragraphs the ids
+    of the tei:p and tei:l; per token with an xml:id, tokens holds the
+    index of its page and paragraph (-1 if there is none) and its offset
+    in the fulltext of the paragraph
+    """
+    offsets = TokenOffsets()
+    text = next(tree.getroot().iter(TEXT_TAG), None)
+    if text is not None:
+        offsets.walk(text)
+    return offsets.to_json()
+
+
+def write_token_offsets(tree: etree._ElementTree, doc_id: str, output_dir: str) -> dict:
+    token_offsets = return_token_offsets(tree)
+    output_writer.write_json(
+        os.path.join(output_dir, f"{doc_id}.json"),
+        token_offsets,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return token_offsets
+
+
+def load_token_offsets(output_dir: str, doc_id: str) -> dict:
+    """
+    token id -> (facs, paragraph id, offset) of a document
+    """
+    with open(os.path.join(output_dir, f"{doc_id}.json"), "r", encoding="utf-8") as f:
+        data = json.load(f)
+    tokens = data["tokens"]
+    return dict(
+        (
+            token_id,
+            (
+                data["pages"][page] if page >= 0 else None,
+                data["paragraphs"][paragraph] if paragraph >= 0 else None,
+                offset,
+            ),
+        )
+        for token_id, page, paragraph, offset in zip(
+            tokens["id"], tokens["page"], tokens["paragraph"], tokens["offset"]
+        )
+    )
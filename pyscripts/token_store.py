@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# columnar store of the tokens of all verticals: every attribute becomes a
+# uint32 array of ids into a sorted vocabulary, next to the offsets of the
+# documents and the token spans of the structures, all as .npy files that
+# can be memory-mapped, e.g. to count lemmas with numpy.bincount
+import argparse
+import io
+import os
+import re
+import numpy as np
+from output_writer import output_writer
+from token_index import TOKEN_ATTRIBUTES, is_structure
+
+STORE_PATH = "./out/token_store"
+OPEN_STRUCTURE = re.compile(r'<(\w+)((?: \w+="[^"]*")*)>')
+ID_ATTRIBUTE = re.compile(r' id="([^"]*)"')
+# encoded like the token attributes
+STRUCTURE_ATTRIBUTES = ["structure_tag", "structure_id"]
+
+
+def write_npy(path: str, array: np.ndarray):
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    output_writer.write_bytes(path, buffer.getvalue())
+
+
+def write_lines(path: str, lines):
+    output_writer.write_text(path, "".join(f"{line}\n" for line in lines))
+
+
+def read_lines(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().split("\n")[:-1]
+
+
+def encode(values: list) -> tuple:
+    """
+    returns the sorted distinct values and the uint32 id of each value
+    """
+    vocabulary, ids = np.unique(np.array(values, dtype=object), return_inverse=True)
+    return vocabulary.tolist(), ids.astype(np.uint32)
+
+
+class TokenStore:
+    def __init__(self, output_dir: str = STORE_PATH):
+        self.output_dir = output_dir
+        self.columns = dict((attr, []) for attr in TOKEN_ATTRIBUTES + STRUCTURE_ATTRIBUTES)
+        self.documents = []
+        self.doc_offsets = [0]
+        # [start, end) token positions of the structures, in order of opening
+        self.structure_spans = []
+
+    def add(self, doc_id: str, vertical: str):
+        position = self.doc_offsets[-1]
+        # indices into structure_spans of the open structures
+        open_structures = []
+        for line in vertical.split("\n"):
+            if not line:
+                continue
+            if not is_structure(line):
+                fields = line.split("\t")
+                fields += [""] * (len(TOKEN_ATTRIBUTES) - len(fields))
+                for attr, val in zip(TOKEN_ATTRIBUTES, fields):
+                    self.columns[attr].append(val)
+                position += 1
+            elif line.startswith("</"):
+                if line != "</doc>":
+                    self.structure_spans[open_structures.pop()][1] = position
+            elif not line.endswith("/>") and not line.startswith("<doc "):
+                match = OPEN_STRUCTURE.match(line)
+                structure_id = ID_ATTRIBUTE.search(match.group(2))
+                self.columns["structure_tag"].append(match.group(1))
+                self.columns["structure_id"].append(structure_id.group(1) if structure_id else "")
+                open_structures.append(len(self.structure_spans))
+                self.structure_spans.append([position, position])
+        self.documents.append(doc_id)
+        self.doc_offsets.append(position)
+
+    def write(self) -> int:
+        """
+        writes <attr>.npy and its vocabulary <attr>.txt for the token and
+        structure attributes, returns the number of tokens
+        """
+        for attr, values in self.columns.items():
+            vocabulary, ids = encode(values)
+            write_npy(os.path.join(self.output_dir, f"{attr}.npy"), ids)
+            write_lines(os.path.join(self.output_dir, f"{attr}.txt"), vocabulary)
+        write_lines(os.path.join(self.output_dir, "documents.txt"), self.documents)
+        write_npy(
+            os.path.join(self.output_dir, "doc_offsets.npy"),
+            np.array(self.doc_offsets, dtype=np.int64),
+        )
+        write_npy(
+            os.path.join(self.output_dir, "structure_spans.npy"),
+            np.array(self.structure_spans, dtype=np.int64).reshape(-1, 2),
+        )
+        output_writer.remove_stale(self.output_dir)
+        return self.doc_offsets[-1]
+
+
+def load_column(store_dir: str, attr: str) -> tuple:
+    """
+    returns (vocabulary, memory-mapped ids) of an attribute
+    """
+    return (
+        read_lines(os.path.join(store_dir, f"{attr}.txt")),
+        np.load(os.path.join(store_dir, f"{attr}.npy"), mmap_mode="r"),
+    )
+
+
+def return_frequencies(store_dir: str, attr: str) -> list:
+    """
+    (value, count) of an attribute, most frequent first
+    """
+    vocabulary, ids = load_column(store_dir, attr)
+    counts = np.bincount(ids, minlength=len(vocabulary))
+    order = np.argsort(-counts, kind="stable")
+    return [(vocabulary[i], int(counts[i])) for i in order if counts[i]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="frequencies of a token or structure attribute")
+    parser.add_argument("attribute", choices=TOKEN_ATTRIBUTES + STRUCTURE_ATTRIBUTES)
+    parser.add_argument("--store", default=STORE_PATH)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+    for value, count in return_frequencies(args.store, args.attribute)[:args.top]:
+        print(f"{count}\t{value}")
@@ -0,0 +1,64 @@
+# compares typesense entries against the content hashes of the previous run
+import hashlib
+import json
+import os
+from output_writer import output_writer
+
+# the hashes of a run wait next to the state until its diff is loaded
+PENDING_SUFFIX = ".pending"
+
+
+def hash_entry(entry: dict) -> str:
+    serialized = json.dumps(entry, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def load_state(path: str) -> dict:
+    if not path or not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def diff_entries(entries: dict, previous_state: dict):
+    """
+    returns the ids of new or changed entries, the ids missing since the
+    previous run and the hashes of the current entries
+    """
+    state = dict((_id, hash_entry(entry)) for _id, entry in entries.items())
+    upserts = [_id for _id, digest in state.items() if previous_state.get(_id) != digest]
+    deletes = [_id for _id in previous_state if _id not in state]
+    return upserts, deletes, state
+
+
+def write_diff(
+    entries: dict,
+    previous_state: dict,
+    state_path: str,
+    upserts_path: str,
+    deletes_path: str,
+):
+    upserts, deletes, state = diff_entries(entries, previous_state)
+    output_writer.write_text(
+        upserts_path,
+        "".join(json.dumps(entries[_id], ensure_ascii=False) + "\n" for _id in upserts),
+    )
+    output_writer.write_json(deletes_path, deletes, indent=4)
+    output_writer.write_json(state_path + PENDING_SUFFIX, state, indent=4, sort_keys=True)
+    print(
+        f"typesense diff: {len(upserts)} upserts, {len(deletes)} deletes, "
+        f"{len(state) - len(upserts)} unchanged"
+    )
+    return upserts, deletes
+
+
+def commit_state(state_path: str) -> bool:
+    """
+    makes the hashes of the last extract_data.py run the state the next
+    run diffs against, once load_typesense.py has loaded its diff
+    """
+    pending_path = state_path + PENDING_SUFFIX
+    if not os.path.isfile(pending_path):
+        return False
+    os.replace(pending_path, state_path)
+    return True
@@ -0,0 +1,89 @@
+# collects the spellings annotated with each lemma (Jnnhalt/Inhalt,
+# verurtheilte/verurteilen), so searches can be expanded to all of them
+from collections import Counter
+
+TEI = "{http://www.tei-c.org/ns/1.0}"
+# readings left out of the fulltext, see XmlDocument.return_doc_text
+SKIPPED_TAGS = [f"{TEI}rdg", f"{TEI}sic"]
+# pos prefixes of the open word classes, variants of function words (the
+# forms of 'd' or 'sein') would make searches match almost anything
+OPEN_WORD_CLASSES = ("NN", "NE", "ADJ", "VV")
+MIN_LEMMA_LENGTH = 3
+
+
+def return_surface(element) -> str:
+    text = element.text or ""
+    for child in element:
+        if child.tag not in SKIPPED_TAGS:
+            text += return_surface(child)
+        text += child.tail or ""
+    return text
+
+
+def return_readings(text_element, nsmap: dict) -> list:
+    """
+    (surface, lemma, pos) of the tokens of text_element in document order,
+    leaving out those inside tei:rdg and tei:sic like the fulltext does
+    """
+    return [
+        ("".join(return_surface(w).split()), w.get("lemma", ""), w.get("pos", ""))
+        for w in text_element.xpath(
+            ".//tei:w[not(ancestor::tei:rdg or ancestor::tei:sic)]", namespaces=nsmap
+        )
+    ]
+
+
+def return_lemma_text(readings: list) -> str:
+    return " ".join(lemma if lemma else surface for surface, lemma, _ in readings)
+
+
+class VariantTable:
+    def __init__(self):
+        # (lemma, surface) -> frequency
+        self.counts = Counter()
+
+    def add(self, readings: list):
+        for surface, lemma, pos in readings:
+            if (
+                surface
+                and len(lemma) >= MIN_LEMMA_LENGTH
+                # numbers tagged as adjectives ('1722.ten')
+                and lemma[0].isalpha()
+                and pos.startswith(OPEN_WORD_CLASSES)
+            ):
+                self.counts[(lemma, surface)] += 1
+
+    def to_records(self) -> list:
+        return [[lemma, surface, count] for (lemma, surface), count in self.counts.items()]
+
+    def add_records(self, records: list):
+        for lemma, surface, count in records:
+            self.counts[(lemma, surface)] += count
+
+    def to_json(self) -> dict:
+        """
+        lemma -> surface -> frequency, the most frequent spelling first
+        """
+        variants = {}
+        for (lemma, surface), count in sorted(
+            self.counts.items(), key=lambda item: (item[0][0], -item[1], item[0][1])
+        ):
+            variants.setdefault(lemma, {})[surface] = count
+        return variants
+
+    def return_synonyms(self, min_count: int = 1) -> list:
+        """
+        one multi-way typesense synonym per lemma spelled in more than one
+        way (ignoring case), the lemma itself included; spellings with
+        other than letters (hyphenation marks, elisions) are left out
+        """
+        synonyms = []
+        for lemma, surfaces in self.to_json().items():
+            forms = [lemma.lower()] + [
+                surface.lower() for surface, count in surfaces.items()
+                if count >= min_count and surface.isalpha()
+            ]
+            forms = list(dict.fromkeys(forms))
+            if len(forms) > 1:
+                synonyms.append({"id": f"lemma_{lemma}", "synonyms": forms})
+        return synonyms
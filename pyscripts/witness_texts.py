@@ -0,0 +1,92 @@
+# the fulltext as read by every witness of a print, collected in one walk
+# over the edition: common text goes to all witnesses, tei:lem to the
+# primary witness and to those without a reading of their own, tei:rdg
+# to the witnesses it is attested by
+import lxml.etree as etree
+
+TEI_NS = "http://www.tei-c.org/ns/1.0"
+XML_ID = "{http://www.w3.org/XML/1998/namespace}id"
+APP_TAG = f"{{{TEI_NS}}}app"
+LEM_TAG = f"{{{TEI_NS}}}lem"
+RDG_TAG = f"{{{TEI_NS}}}rdg"
+# removed together with their tail, see XmlDocument.return_doc_text
+REMOVED_TAGS = [f"{{{TEI_NS}}}sic"]
+# left out of the fulltext, their tail is kept
+SKIPPED_TAGS = [f"{{{TEI_NS}}}{tag}" for tag in ["fs", "f", "figDesc"]]
+
+
+def return_witnesses(tree: etree._ElementTree) -> list:
+    """
+    (id, type) of the witnesses, as typed by tidy_readings
+    """
+    return [
+        (witness.get(XML_ID).strip(), witness.get("type", "secondary"))
+        for witness in tree.getroot().iter(f"{{{TEI_NS}}}witness")
+        if witness.get(XML_ID) and witness.getparent().tag == f"{{{TEI_NS}}}listWit"
+    ]
+
+
+def return_wit_ids(reading: etree._Element) -> set:
+    return set(wit.strip("#'") for wit in reading.get("wit", "").split())
+
+
+class WitnessTexts:
+    def __init__(self, witness_ids: list, primary_id: str):
+        self.primary_id = primary_id
+        self.parts = dict((witness_id, []) for witness_id in witness_ids)
+
+    def add(self, text: str, readers: frozenset):
+        if text:
+            for witness_id in readers:
+                self.parts[witness_id].append(text)
+
+    def return_readers(self, child: etree._Element, readers: frozenset, attested: set) -> frozenset:
+        if child.tag in REMOVED_TAGS:
+            return frozenset()
+        if child.tag == RDG_TAG:
+            return readers & (return_wit_ids(child) - {self.primary_id})
+        if child.tag == LEM_TAG:
+            return readers - attested
+        return readers
+
+    def walk(self, element: etree._Element, readers: frozenset):
+        if element.tag in SKIPPED_TAGS:
+            return
+        self.add(element.text, readers)
+        # witnesses with a reading of their own skip the lemma
+        attested = set()
+        if element.tag == APP_TAG:
+            for rdg in element.iterchildren(RDG_TAG):
+                attested |= return_wit_ids(rdg)
+            attested.discard(self.primary_id)
+        for child in element:
+            child_readers = self.return_readers(child, readers, attested)
+            if child_readers:
+                self.walk(child, child_readers)
+            # the text after a reading is common again, only sic takes its tail along
+            if child.tag not in REMOVED_TAGS:
+                self.add(child.tail, readers)
+
+    def to_texts(self) -> dict:
+        return dict(
+            (witness_id, " ".join("".join(parts).split()))
+            for witness_id, parts in self.parts.items()
+        )
+
+
+def return_witness_texts(tree: etree._ElementTree) -> list:
+    """
+    one {id, type, text} per witness, normalized like the fulltext; empty
+    for editions of a single witness
+    """
+    witnesses = return_witnesses(tree)
+    text = next(tree.getroot().iter(f"{{{TEI_NS}}}text"), None)
+    if len(witnesses) < 2 or text is None:
+        return []
+    primary_id = next((_id for _id, _type in witnesses if _type == "primary"), witnesses[0][0])
+    witness_texts = WitnessTexts([_id for _id, _ in witnesses], primary_id)
+    witness_texts.walk(text, frozenset(witness_texts.parts))
+    texts = witness_texts.to_texts()
+    return [
+        {"id": _id, "type": _type, "text": texts[_id]} for _id, _type in witnesses
+    ]
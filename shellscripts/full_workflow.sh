@@ -1,11 +1,12 @@
 #!/bin/bash
 rm -rf cloned_repo out
-./shellscripts/dl_and_prepare_gl_data.sh
-./pyscripts/extract_data.py
-./pyscripts/extract_verticals.py
 mkdir cloned_repo
 git clone https://github.com/Armesuenderblaetter/armesuenderblaetter_data_ouput.git cloned_repo
+./shellscripts/dl_and_prepare_gl_data.sh
+./pyscripts/extract_data.py --typesense-state cloned_repo/json/typesense_hashes.json
+./pyscripts/extract_verticals.py
 cp -r out/* cloned_repo/
+./pyscripts/precompress_outputs.py cloned_repo --minify --state cloned_repo/json/precompress_state.json
 cd cloned_repo
 git add .
 git commit -m "$(date) new data"